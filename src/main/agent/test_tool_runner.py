@@ -2,15 +2,48 @@
 Unit tests for tool_runner module.
 
 Tests the ToolEnvironment class and execute_tools_from_response function.
+
+TestToolEnvironment gives each test its own temp directory (or the
+in-memory fake FS); TestExecuteToolsFlags shares one class-scoped temp
+directory across its tests.
 """
 
+import os
 import unittest
+import shutil
 import tempfile
-import os
-import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 
-from tools import ToolError
+from tools import AgentTools, ToolError
+
+
+# Structured tool-call payloads shared by several tests (arguments are
+# pre-serialized JSON, as delivered by the LLM).
+_TOOL_CALL_WRITE_OUT = {
+    "type": "function",
+    "id": "call_1",
+    "function": {
+        "name": "write_file",
+        "arguments": '{"path": "out.txt", "content": "data"}',
+    },
+}
+_TOOL_CALL_CONFIRM = {
+    "type": "function",
+    "id": "call_1",
+    "function": {"name": "confirm_task_complete", "arguments": "{}"},
+}
+_TOOL_CALL_UNKNOWN = {
+    "type": "function",
+    "id": "call_1",
+    "function": {"name": "nonexistent_tool", "arguments": "{}"},
+}
+
+# Allowed-tool sets for the inline-call parser tests.
+_ALLOWED_FOR_PARSE = frozenset(["write_file", "read_file"])
+_ALLOWED_WRITE_ONLY = frozenset(["write_file"])
+_ALLOWED_READ_ONLY = frozenset(["read_file"])
 
 
 class TestToolEnvironment(unittest.TestCase):
@@ -34,13 +67,41 @@ class TestToolEnvironment(unittest.TestCase):
         }
 
     def tearDown(self):
-        import shutil
         shutil.rmtree(self.tmpdir, ignore_errors=True)
 
+    def _use_fake_fs(self):
+        """Replace AgentTools file I/O with an in-memory store.
+
+        For tests that only check tracking/capture bookkeeping, not actual
+        filesystem behaviour. Must be called before ``_make_env``.
+        """
+        store = {}
+
+        def _write(tools_self, path, content, encoding="utf-8"):
+            created = path not in store
+            store[path] = content
+            return {"path": path, "size": len(content), "created": created,
+                    "encoding": encoding}
+
+        def _read(tools_self, path, page=1, encoding="utf-8", page_size=500):
+            return {"content": store[path], "page": 1, "total_pages": 1,
+                    "total_lines": len(store[path].splitlines()), "path": path}
+
+        def _edit(tools_self, path, diff, encoding="utf-8"):
+            return {"path": path, "hunks": 1, "added": 0, "removed": 0,
+                    "success": True}
+
+        for name, fake in (("write_file", _write), ("read_file", _read),
+                           ("edit_file", _edit)):
+            patcher = patch.object(AgentTools, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return store
+
     def _make_env(self, **overrides):
         from main.agent.tool_runner import ToolEnvironment
-        config = dict(self.mock_agent.config, **overrides)
-        self.mock_agent.config = config
+        if overrides:
+            self.mock_agent.config = {**self.mock_agent.config, **overrides}
         return ToolEnvironment(
             agent=self.mock_agent,
             working_dir=self.tmpdir,
@@ -60,8 +121,12 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_bindings_built_once(self):
         """get_bindings() should return the same dict on repeated calls."""
+        from main.agent.tool_runner import ToolEnvironment
         env = self._make_env()
-        self.assertIs(env.get_bindings(), env.get_bindings())
+        first = env.get_bindings()
+        with patch.object(ToolEnvironment, "_build_bindings") as rebuild:
+            self.assertIs(env.get_bindings(), first)
+        rebuild.assert_not_called()
 
     def test_disallowed_tool_raises(self):
         """Calling a tool not in allowed_tools should raise ToolError."""
@@ -114,6 +179,7 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_write_file_tracked(self):
         """write_file() calls should be tracked in files_produced."""
+        self._use_fake_fs()
         env = self._make_env()
         bindings = env.get_bindings()
         bindings["write_file"]("test.txt", "content")
@@ -121,6 +187,7 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_edit_file_tracked(self):
         """edit_file() calls should be tracked in files_produced."""
+        self._use_fake_fs()
         env = self._make_env()
         bindings = env.get_bindings()
         # Create file first
@@ -131,6 +198,7 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_read_file_not_tracked_as_produced(self):
         """read_file() should NOT be listed in files_produced."""
+        self._use_fake_fs()
         env = self._make_env()
         bindings = env.get_bindings()
         bindings["write_file"]("test.txt", "content")
@@ -152,6 +220,7 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_tool_output_captured(self):
         """Tool outputs should be captured in env.tool_outputs."""
+        self._use_fake_fs()
         env = self._make_env()
         bindings = env.get_bindings()
         bindings["write_file"]("test.txt", "content")
@@ -160,6 +229,7 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_tool_output_has_pagination(self):
         """Tool outputs for paginated tools should include page info."""
+        self._use_fake_fs()
         env = self._make_env()
         bindings = env.get_bindings()
         bindings["write_file"]("test.txt", "content")
@@ -183,10 +253,13 @@ class TestToolEnvironment(unittest.TestCase):
 
     def test_developer_audit_files_tracked(self):
         """Developer's audit_files() calls should be tracked in audit_requests."""
+        # Real FS: the audit checks that app.py exists on disk
         env = self._make_env()
         bindings = env.get_bindings()
         bindings["write_file"]("app.py", "print('hello')")
-        bindings["audit_files"](["app.py"], description="Review code")
+        result = bindings["audit_files"](["app.py"], description="Review code")
+        self.assertEqual(result["files"], ["app.py"])
+        self.assertEqual(result["invalid_files"], [])
         self.assertEqual(len(env.audit_requests), 1)
         self.assertEqual(env.audit_requests[0]["files"], ["app.py"])
 
@@ -198,12 +271,55 @@ class TestToolEnvironment(unittest.TestCase):
         with self.assertRaises(ToolError):
             bindings["audit_files"](["unproduced.py"], description="Review")
 
+    def test_audit_path_checks_cached_until_mutation(self):
+        """Repeat audits reuse path checks; a mutating tool invalidates them."""
+        env = self._make_env()
+        bindings = env.get_bindings()
+        bindings["write_file"]("app.py", "x = 1")
+        with patch("main.agent.tool_runner.os.path.isfile",
+                   wraps=os.path.isfile) as isfile:
+            bindings["audit_files"](["app.py"])
+            bindings["audit_files"](["app.py"])
+            self.assertEqual(isfile.call_count, 1)
+        bindings["delete_file"]("app.py")
+        result = bindings["audit_files"](["app.py"])
+        self.assertEqual(result["invalid_files"], ["app.py"])
+
+    def test_audit_many_files_checked_in_parallel(self):
+        """Large audits should validate every path, keeping the caller's order."""
+        env = self._make_env()
+        bindings = env.get_bindings()
+        names = [f"mod{i}.py" for i in range(8)]
+        for name in names:
+            bindings["write_file"](name, "x = 1")
+        os.remove(os.path.join(self.tmpdir, "mod3.py"))
+        with patch("main.agent.tool_runner.ThreadPoolExecutor",
+                   wraps=ThreadPoolExecutor) as pool:
+            result = bindings["audit_files"](names)
+        pool.assert_called_once()
+        self.assertEqual(result["files"], [n for n in names if n != "mod3.py"])
+        self.assertEqual(result["invalid_files"], ["mod3.py"])
+
+    def test_audit_parallel_check_errors_propagate(self):
+        """A failure inside a parallel path check should reach the caller."""
+        from main.agent.tool_runner import ToolEnvironment
+        env = self._make_env()
+        bindings = env.get_bindings()
+        names = [f"mod{i}.py" for i in range(8)]
+        for name in names:
+            bindings["write_file"](name, "x = 1")
+        with patch.object(ToolEnvironment, "_find_audit_path_problem",
+                          side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                bindings["audit_files"](names)
+
 
 class TestExecuteToolsFromResponse(unittest.TestCase):
     """Tests for the main execute_tools_from_response function."""
 
     def setUp(self):
         self.tmpdir = tempfile.mkdtemp()
+        self.tmp_path = Path(self.tmpdir)
         self.mock_agent = Mock()
         self.mock_agent.name = "developer01"
         self.mock_agent.role = "developer"
@@ -219,136 +335,189 @@ class TestExecuteToolsFromResponse(unittest.TestCase):
         }
 
     def tearDown(self):
-        import shutil
         shutil.rmtree(self.tmpdir, ignore_errors=True)
 
-    def test_no_tool_calls_returns_not_executed(self):
-        """Response with no tool calls should return tools_executed=False."""
+    # (label, response, message, expected files, expected code blocks)
+    FILE_PRODUCING_CASES = [
+        ("code_block",
+         '```python\nwrite_file("hello.txt", "hello world")\n```',
+         None, ["hello.txt"], 1),
+        ("inline",
+         "write_file('inline.txt', 'inline content')",
+         None, ["inline.txt"], 0),
+        ("multiple_code_blocks",
+         '```python\nwrite_file("a.txt", "aaa")\n```\n'
+         'Some text\n'
+         '```python\nwrite_file("b.txt", "bbb")\n```',
+         None, ["a.txt", "b.txt"], 2),
+        ("structured",
+         "",
+         {"content": "", "tool_calls": [_TOOL_CALL_WRITE_OUT]},
+         ["out.txt"], 0),
+        ("tool_outputs",
+         '```python\nwrite_file("test.txt", "content")\n```',
+         None, ["test.txt"], 1),
+    ]
+
+    def test_file_producing_responses(self):
+        """Code blocks, inline calls and structured calls should all write files."""
+        from main.agent.tool_runner import execute_tools_from_response
+        for label, response, message, files, blocks in self.FILE_PRODUCING_CASES:
+            with self.subTest(label):
+                result = execute_tools_from_response(
+                    self.mock_agent, response, self.tmpdir, message=message
+                )
+                self.assertTrue(result["tools_executed"])
+                self.assertEqual(result["code_blocks_found"], blocks)
+                self.assertTrue(len(result["tool_outputs"]) > 0)
+                for name in files:
+                    self.assertIn(name, result["files_produced"])
+                    # Verify file was actually created
+                    self.assertTrue((self.tmp_path / name).exists())
+
+    def test_failed_code_block_recorded(self):
+        """Failed code blocks should be recorded with error info."""
         from main.agent.tool_runner import execute_tools_from_response
+        response = '```python\nread_file("nonexistent_dir/file.txt")\n```'
         result = execute_tools_from_response(
-            self.mock_agent, "Just a plain response.", self.tmpdir
+            self.mock_agent, response, self.tmpdir
         )
-        self.assertFalse(result["tools_executed"])
+        self.assertTrue(result["tools_executed"])
+        failed = [r for r in result["results"] if not r.get("success")]
+        self.assertTrue(len(failed) > 0, "Should have at least one failure")
 
-    def test_python_code_block_executed(self):
-        """Python code blocks should be extracted and executed."""
+    def test_repeated_code_block_runs_each_time(self):
+        """A cached compiled block should still execute on every occurrence."""
+        from main.agent.tool_runner import execute_tools_from_response
+        block = '```python\nwrite_file("again.txt", "x")\n```'
+        for _ in range(2):
+            result = execute_tools_from_response(
+                self.mock_agent, block, self.tmpdir
+            )
+            self.assertEqual(result["estimated_tool_calls"], 1)
+            self.assertIn("again.txt", result["files_produced"])
+
+    def test_syntax_error_code_block_recorded(self):
+        """Blocks that fail to compile should be recorded like runtime errors."""
         from main.agent.tool_runner import execute_tools_from_response
-        response = '```python\nwrite_file("hello.txt", "hello world")\n```'
+        response = '```python\nwrite_file("a.txt",\n```'
         result = execute_tools_from_response(
             self.mock_agent, response, self.tmpdir
         )
-        self.assertTrue(result["tools_executed"])
-        self.assertIn("hello.txt", result.get("files_produced", []))
-        # Verify file was actually created
-        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "hello.txt")))
+        self.assertFalse(result["results"][0]["success"])
+        self.assertIn("<string>", result["results"][0]["error"])
 
-    def test_structured_tool_calls_executed(self):
-        """Structured tool_calls from message dict should be executed."""
+    def test_code_block_invalidates_audit_path_checks(self):
+        """A later block's audit should see files an earlier block removed via os."""
         from main.agent.tool_runner import execute_tools_from_response
-        message = {
-            "content": "",
-            "tool_calls": [{
-                "type": "function",
-                "id": "call_1",
-                "function": {
-                    "name": "write_file",
-                    "arguments": json.dumps({"path": "out.txt", "content": "data"})
-                }
-            }]
-        }
+        response = (
+            '```python\nwrite_file("app.py", "x = 1")\naudit_files(["app.py"])\n```\n'
+            '```python\nimport os\nos.remove(os.path.join(WORKDIR, "app.py"))\n```\n'
+            '```python\naudit_files(["app.py"])\n```'
+        ).replace("WORKDIR", repr(self.tmpdir))
+        with self.assertLogs("main.agent.tool_runner", "WARNING") as logs:
+            result = execute_tools_from_response(
+                self.mock_agent, response, self.tmpdir
+            )
+        self.assertTrue(all(r["success"] for r in result["results"]))
+        self.assertIn("File not found for audit: app.py", logs.output[0])
+
+    def test_consecutive_read_calls_keep_order(self):
+        """Batched read-only calls should report results and outputs in call order."""
+        from main.agent.tool_runner import execute_tools_from_response
+        for name in ("a.txt", "b.txt", "c.txt"):
+            (self.tmp_path / name).write_text(name.upper())
+
+        def read(path):
+            return {"type": "function", "id": path, "function": {
+                "name": "read_file", "arguments": f'{{"path": "{path}"}}'}}
+
+        message = {"content": "", "tool_calls": [
+            read("a.txt"), read("missing.txt"), read("b.txt"), read("c.txt"),
+        ]}
         result = execute_tools_from_response(
             self.mock_agent, "", self.tmpdir, message=message
         )
-        self.assertTrue(result["tools_executed"])
-        self.assertIn("out.txt", result.get("files_produced", []))
-        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "out.txt")))
+        self.assertEqual([r["success"] for r in result["results"]],
+                         [True, False, True, True])
+        self.assertEqual([o["kwargs"]["path"] for o in result["tool_outputs"]],
+                         ["a.txt", "b.txt", "c.txt"])
+        self.assertIn("C.TXT", result["tool_outputs"][2]["content"])
+
+
+class TestExecuteToolsFlags(unittest.TestCase):
+    """Tests for execute_tools_from_response that only inspect flags and result shape.
+
+    These never read back from the working directory, so a single
+    class-scoped directory is shared instead of one per test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shared_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.shared_dir, ignore_errors=True)
 
-    def test_inline_calls_executed(self):
-        """Plain-text inline function calls should be parsed and executed."""
+    def setUp(self):
+        self.mock_agent = Mock()
+        self.mock_agent.name = "developer01"
+        self.mock_agent.role = "developer"
+        self.mock_agent.config = {
+            "role": "developer",
+            "allowed_tools": [
+                "read_file", "write_file", "confirm_task_complete",
+                "list_directory", "edit_file",
+                "list_all_files", "search_files", "get_file_info",
+                "delete_file", "audit_files",
+            ],
+            "default_git_branch": None,
+        }
+
+    def test_no_tool_calls_returns_not_executed(self):
+        """Response with no tool calls should return tools_executed=False."""
         from main.agent.tool_runner import execute_tools_from_response
-        response = "write_file('inline.txt', 'inline content')"
         result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
+            self.mock_agent, "Just a plain response.", self.shared_dir
         )
-        self.assertTrue(result["tools_executed"])
-        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "inline.txt")))
+        self.assertFalse(result["tools_executed"])
 
     def test_task_complete_flag_from_code_block(self):
         """confirm_task_complete() in code block should set task_complete."""
         from main.agent.tool_runner import execute_tools_from_response
         response = '```python\nconfirm_task_complete()\n```'
         result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
+            self.mock_agent, response, self.shared_dir
         )
         self.assertTrue(result["task_complete"])
 
     def test_task_complete_flag_from_structured_call(self):
         """confirm_task_complete as structured tool call should set task_complete."""
         from main.agent.tool_runner import execute_tools_from_response
-        message = {
-            "content": "",
-            "tool_calls": [{
-                "type": "function",
-                "id": "call_1",
-                "function": {
-                    "name": "confirm_task_complete",
-                    "arguments": "{}"
-                }
-            }]
-        }
+        message = {"content": "", "tool_calls": [_TOOL_CALL_CONFIRM]}
         result = execute_tools_from_response(
-            self.mock_agent, "", self.tmpdir, message=message
+            self.mock_agent, "", self.shared_dir, message=message
         )
         self.assertTrue(result["task_complete"])
 
-    def test_failed_code_block_recorded(self):
-        """Failed code blocks should be recorded with error info."""
-        from main.agent.tool_runner import execute_tools_from_response
-        response = '```python\nread_file("nonexistent_dir/file.txt")\n```'
-        result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
-        )
-        self.assertTrue(result["tools_executed"])
-        failed = [r for r in result["results"] if not r.get("success")]
-        self.assertTrue(len(failed) > 0, "Should have at least one failure")
-
     def test_unknown_structured_tool_recorded(self):
         """Unknown tool names in structured calls should produce error results."""
         from main.agent.tool_runner import execute_tools_from_response
-        message = {
-            "content": "",
-            "tool_calls": [{
-                "type": "function",
-                "id": "call_1",
-                "function": {
-                    "name": "nonexistent_tool",
-                    "arguments": "{}"
-                }
-            }]
-        }
+        message = {"content": "", "tool_calls": [_TOOL_CALL_UNKNOWN]}
         result = execute_tools_from_response(
-            self.mock_agent, "", self.tmpdir, message=message
+            self.mock_agent, "", self.shared_dir, message=message
         )
         failed = [r for r in result["results"] if not r.get("success")]
         self.assertTrue(len(failed) > 0)
         self.assertIn("Unknown tool", failed[0]["error"])
 
-    def test_tool_outputs_present_in_result(self):
-        """Result dict should include tool_outputs list."""
-        from main.agent.tool_runner import execute_tools_from_response
-        response = '```python\nwrite_file("test.txt", "content")\n```'
-        result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
-        )
-        self.assertIn("tool_outputs", result)
-        self.assertTrue(len(result["tool_outputs"]) > 0)
-
     def test_result_dict_structure(self):
         """Result dict should have all expected keys."""
         from main.agent.tool_runner import execute_tools_from_response
         response = '```python\nwrite_file("test.txt", "content")\n```'
         result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
+            self.mock_agent, response, self.shared_dir
         )
         expected_keys = {
             "tools_executed", "code_blocks_found", "code_blocks_executed",
@@ -360,22 +529,6 @@ class TestExecuteToolsFromResponse(unittest.TestCase):
         self.assertIn("files_produced", result)
         self.assertIn("audit_requests", result)
 
-    def test_multiple_code_blocks(self):
-        """Multiple code blocks should all be executed."""
-        from main.agent.tool_runner import execute_tools_from_response
-        response = (
-            '```python\nwrite_file("a.txt", "aaa")\n```\n'
-            'Some text\n'
-            '```python\nwrite_file("b.txt", "bbb")\n```'
-        )
-        result = execute_tools_from_response(
-            self.mock_agent, response, self.tmpdir
-        )
-        self.assertTrue(result["tools_executed"])
-        self.assertEqual(result["code_blocks_found"], 2)
-        self.assertIn("a.txt", result["files_produced"])
-        self.assertIn("b.txt", result["files_produced"])
-
 
 class TestHelperFunctions(unittest.TestCase):
     """Tests for helper/utility functions in tool_runner."""
@@ -385,7 +538,7 @@ class TestHelperFunctions(unittest.TestCase):
         from main.agent.tool_runner import _extract_inline_calls
         calls = _extract_inline_calls(
             "write_file('test.txt', 'content')",
-            ["write_file", "read_file"]
+            _ALLOWED_FOR_PARSE
         )
         self.assertEqual(len(calls), 1)
         self.assertEqual(calls[0][0], "write_file")  # func_name
@@ -396,7 +549,7 @@ class TestHelperFunctions(unittest.TestCase):
         from main.agent.tool_runner import _extract_inline_calls
         calls = _extract_inline_calls(
             "This is just plain text\nwrite_file('test.txt', 'content')\nMore text",
-            ["write_file"]
+            _ALLOWED_WRITE_ONLY
         )
         self.assertEqual(len(calls), 1)
 
@@ -405,11 +558,116 @@ class TestHelperFunctions(unittest.TestCase):
         from main.agent.tool_runner import _extract_inline_calls
         calls = _extract_inline_calls(
             "read_file('test.txt', page=2)",
-            ["read_file"]
+            _ALLOWED_READ_ONLY
         )
         self.assertEqual(len(calls), 1)
         self.assertEqual(calls[0][2], {"page": 2})
 
+    def test_extract_inline_calls_prefilter(self):
+        """Only lines opening with an allowed tool call should be parsed."""
+        from main.agent.tool_runner import _extract_inline_calls
+        calls = _extract_inline_calls(
+            "  read_file('a.txt')\nread_files('b.txt')\nread_file ('c.txt')\n"
+            "write_file('d.txt', 'x')",
+            _ALLOWED_READ_ONLY
+        )
+        self.assertEqual(calls, [("read_file", ["a.txt"], {})])
+
+    def test_extract_inline_calls_unrestricted(self):
+        """With no allowed list, any single-line call should be extracted."""
+        from main.agent.tool_runner import _extract_inline_calls
+        calls = _extract_inline_calls(
+            "Some prose (with parens)\nfoo(1)  # note\nno parens here\n(bar)('x')",
+            None
+        )
+        self.assertEqual(calls, [("foo", [1], {}), ("bar", ["x"], {})])
+
+    def test_extract_inline_calls_repeated_line(self):
+        """A repeated call line should not share mutable arguments."""
+        from main.agent.tool_runner import _extract_inline_calls
+        line = "write_file('a.txt', 'x', tags=['t'])"
+        first, second = _extract_inline_calls(f"{line}\n{line}", _ALLOWED_FOR_PARSE)
+        self.assertEqual(first, second)
+        self.assertIsNot(first[2]["tags"], second[2]["tags"])
+
+    def test_parse_inline_call_skips_cache_for_long_lines(self):
+        """Only short call lines should be kept in the parse cache."""
+        from main.agent.tool_runner import _parse_inline_call, PARSE_CACHE_MAX_CHARS
+        short = "read_file('a.txt')"
+        long = f"write_file('a.txt', {'x' * PARSE_CACHE_MAX_CHARS!r})"
+        self.assertIs(_parse_inline_call(short), _parse_inline_call(short))
+        self.assertIsNot(_parse_inline_call(long), _parse_inline_call(long))
+
+    def test_parse_inline_block_skips_cache_for_long_paragraphs(self):
+        """Only short paragraphs should be kept in the block parse cache."""
+        from main.agent.tool_runner import _parse_inline_block, PARSE_CACHE_MAX_CHARS
+        short = "read_file('a.txt')\nread_file('b.txt')"
+        long = f"read_file('a.txt')\nwrite_file('b.txt', {'x' * PARSE_CACHE_MAX_CHARS!r})"
+        self.assertIs(_parse_inline_block(short), _parse_inline_block(short))
+        self.assertIsNot(_parse_inline_block(long), _parse_inline_block(long))
+
+    def test_extract_inline_calls_multiline(self):
+        """A paragraph of bare calls should yield calls spanning several lines."""
+        from main.agent.tool_runner import _extract_inline_calls
+        response = (
+            "Writing it now:\n\n"
+            "write_file(\n    'a.txt',\n    'x',\n)\nread_file('a.txt')\n\n"
+            "x = read_file('b.txt')\nread_file('c.txt')"
+        )
+        calls = _extract_inline_calls(response, _ALLOWED_FOR_PARSE)
+        self.assertEqual(calls, [
+            ("write_file", ["a.txt", "x"], {}),
+            ("read_file", ["a.txt"], {}),
+            ("read_file", ["c.txt"], {}),
+        ])
+
+    # (label, response, calls expected with read_file/write_file/delete_file)
+    INLINE_REJECTED_CASES = [
+        ("space_before_paren",
+         "read_file ('i')\nread_file('x')",
+         [("read_file", ["x"], {})]),
+        ("semicolon_joined",
+         "read_file('a'); delete_file('b')",
+         []),
+        ("semicolon_after_multiline_call",
+         "read_file(\n    'a'); delete_file('b')\nread_file('c')",
+         [("read_file", ["c"], {})]),
+        ("trailing_semicolon",
+         "read_file('a');\nread_file('b')",
+         [("read_file", ["b"], {})]),
+        ("prefilter_rejected_call_in_paragraph",
+         "print('x')\nread_file(\n    'a')\nread_file('b')",
+         [("read_file", ["b"], {})]),
+        ("call_inside_prose",
+         "Then read_file('x') shows it.\nI will delete_file('y') later.",
+         []),
+    ]
+
+    def test_extract_inline_calls_rejected_in_paragraphs(self):
+        """A paragraph parse must not accept calls a line-by-line parse rejects."""
+        from main.agent.tool_runner import _extract_inline_calls
+        allowed = _ALLOWED_FOR_PARSE | {"delete_file"}
+        for label, response, expected in self.INLINE_REJECTED_CASES:
+            with self.subTest(label):
+                self.assertEqual(_extract_inline_calls(response, allowed), expected)
+
+    def test_compile_code_block_skips_cache_for_long_blocks(self):
+        """Only short code blocks should be kept in the compile cache."""
+        from main.agent.tool_runner import _compile_code_block, PARSE_CACHE_MAX_CHARS
+        short = 'write_file("a.txt", "x")'
+        long = f'write_file("a.txt", {"x" * PARSE_CACHE_MAX_CHARS!r})'
+        self.assertIs(_compile_code_block(short), _compile_code_block(short))
+        self.assertIsNot(_compile_code_block(long), _compile_code_block(long))
+
+    def test_get_tools_for_role_cached(self):
+        """Same tool list should return the same cached tuple, skipping unknown names."""
+        from main.agent.tool_runner import get_tools_for_role, TOOL_DEFINITIONS
+        tools = get_tools_for_role(["read_file", "not_a_tool", "write_file"])
+        self.assertEqual(
+            tools, (TOOL_DEFINITIONS["read_file"], TOOL_DEFINITIONS["write_file"])
+        )
+        self.assertIs(get_tools_for_role(["read_file", "not_a_tool", "write_file"]), tools)
+
     def test_paginate_text_single_page(self):
         """Short text should be a single page."""
         from main.agent.tool_runner import _paginate_text
@@ -430,6 +688,58 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertEqual(total2, 4)
         self.assertNotEqual(page1, page2)
 
+    def test_paginate_text_matches_splitlines(self):
+        """Pages should match slicing str.splitlines() for any line endings."""
+        from main.agent.tool_runner import _paginate_text
+        for text in ("a\nb\nc\n", "a\nb\n\n", "a\nb\nc", "\n", "a\r\nb\rc\n"):
+            lines = text.splitlines()
+            for page in (1, 2, 3):
+                with self.subTest(text=text, page=page):
+                    total = max(1, (len(lines) + 1) // 2)
+                    start = (min(page, total) - 1) * 2
+                    self.assertEqual(
+                        _paginate_text(text, page, 2),
+                        ("\n".join(lines[start:start + 2]), total),
+                    )
+
+    def test_format_tool_output_single_line(self):
+        """Single-line output skips pagination; other line breaks still split."""
+        from main.agent.tool_runner import _format_tool_output
+        entry = _format_tool_output("read_file", ("a.txt",), {}, "one line", 3)
+        self.assertEqual((entry["content"], entry["total_pages"]), ("one line", 1))
+        entry = _format_tool_output("read_file", ("a.txt",), {}, "a\rb", 1)
+        self.assertEqual(entry["content"], "a\nb")
+
+    def test_format_tool_output_streams_nested_json(self):
+        """Nested results should page exactly like their json.dumps text."""
+        import json
+        from main.agent.tool_runner import _format_tool_output, _paginate_text
+        result = {"files": [f"dir{i}/file{i}.py" for i in range(1200)],
+                  "meta": {"count": 1200, "bad": {1, 2}}}
+        for value in (result["files"], {"files": result["files"]}, result):
+            for page in (1, 2, 3, 99):
+                with self.subTest(kind=type(value).__name__, page=page):
+                    try:
+                        text = json.dumps(value, indent=2, ensure_ascii=True)
+                    except TypeError:
+                        text = str(value)
+                    entry = _format_tool_output("list_all_files", (), {}, value, page)
+                    self.assertEqual(
+                        (entry["content"], entry["total_pages"]),
+                        _paginate_text(text, page, entry["page_lines"]),
+                    )
+
+    def test_utc_now_iso_matches_datetime(self):
+        """Cached-prefix timestamps should match datetime.isoformat()."""
+        from datetime import datetime, timezone
+        from main.agent.tool_runner import _utc_now_iso
+        for now in (1700000000.0, 1700000000.25, 1700000000.9999996, 1700000061.5):
+            with self.subTest(now=now):
+                with patch("main.agent.tool_runner.time.time", return_value=now):
+                    stamp = _utc_now_iso()
+                self.assertEqual(
+                    stamp, datetime.fromtimestamp(now, timezone.utc).isoformat())
+
     def test_stringify_tool_output_string(self):
         """String results should pass through."""
         from main.agent.tool_runner import _stringify_tool_output
@@ -447,6 +757,22 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertIn('"key"', result)
         self.assertIn('"value"', result)
 
+    def test_stringify_tool_output_matches_json_dumps(self):
+        """The flat-dict fast path should match json.dumps(indent=2) exactly."""
+        import json
+        from main.agent.tool_runner import _stringify_tool_output
+        for value in (
+            {},
+            {"status": "ok", "size": 3, "ok": True, "err": None, "files": []},
+            {"path": "café \"q\"\n", "nested": {"a": [1, 2]}},
+            {1: "int key", "ratio": 0.5},
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(
+                    _stringify_tool_output(value),
+                    json.dumps(value, indent=2, ensure_ascii=True),
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -5,7 +5,7 @@ This module is the canonical home for the agent-tool interface:
 - ``AgentTools``: safe file-system, package-management, and git operations
 - ``ToolError`` and subclasses: exception hierarchy
 - ``TOOL_DEFINITIONS``: JSON schemas for structured tool calling (OpenAI format)
-- ``get_tools_for_role()``: filter schemas by allowed tool list
+- ``get_tools_for_role()``: filter schemas by allowed tool list (cached)
 - ``ToolEnvironment``: builds name -> callable mapping with output capture,
   file tracking, audit tracking, and task-completion signals
 - ``execute_tools_from_response()``: parses agent output (code blocks,
@@ -15,15 +15,33 @@ The ``tools`` package re-exports the public symbols for backward compatibility.
 """
 
 import ast
+import codecs
+import errno
+import functools
+import importlib.metadata
+import itertools
 import json
 import logging
+import mmap
 import os
 import re
+import secrets
+import shutil
+import stat
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from glob import glob, escape as glob_escape
+from json.encoder import encode_basestring_ascii as json_escape
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Tuple, Set
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Tuple, Set, Iterable, Iterator, Mapping, Union
+
+from httpx import Client
+
+from main.agent.callbacks import raise_callback
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +55,108 @@ DEFAULT_MAX_SEARCH_RESULTS = 100
 DEFAULT_WORKING_DIR = os.getcwd()
 ALLOWED_PACKAGE_PREFIXES = []  # Empty = allow all (can be restricted)
 
+MMAP_READ_MIN_SIZE = 256 * 1024  # Files this large page via an mmap'd index
+SEARCH_MAX_WORKERS = 8  # Threads walking subdirectories for "**/" searches
+AUDIT_MAX_WORKERS = 8  # Threads checking audit paths in parallel
+AUDIT_PARALLEL_MIN_FILES = 5  # Fewer unchecked audit paths are checked inline
+TOOL_CALL_MAX_WORKERS = 4  # Threads running consecutive read-only tool calls
+PARSE_CACHE_MAX_CHARS = 4096  # Longer agent source is compiled/parsed uncached
+
+# pip invocation prefix; skipping the self version check saves each install
+# and list a round-trip to PyPI before pip does any real work.
+_PIP_COMMAND = (sys.executable, "-m", "pip", "--disable-pip-version-check", "--no-input")
+
+# Encodings in which a b"\n" byte is always a newline character, so line
+# boundaries can be found without decoding.
+_NEWLINE_SAFE_ENCODINGS = ("utf-8", "utf-8-sig", "ascii")
+
+PACKAGE_SEARCH_TTL = 300  # Seconds a registry lookup is reused for
+INSTALLED_PACKAGES_TTL = 5.0  # Seconds a pip list / npm ls result is reused for
+
+_PACKAGE_NAME_RE = re.compile(r"[\w.-]+")
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_BRANCH_NAME_RE = re.compile(r"^[\w\-/\.]+$")
+_CODE_BLOCK_RE = re.compile(r"```python\n(.*?)\n```", re.DOTALL)
+# A "(" followed later by ")": the least any line holding a call needs
+_CALL_PARENS_RE = re.compile(r"[^(]*\(.*\)")
+# Line boundaries str.splitlines() honours besides "\n"; single-character
+# "in" checks are memchr-fast where a character-class regex scan is not.
+_ASCII_LINE_BREAKS = "\r\v\f\x1c\x1d\x1e"
+_OTHER_LINE_BREAKS = _ASCII_LINE_BREAKS + "\x85\u2028\u2029"
+
+
+# (language, name) -> (fetched at, search result) for search_package
+_package_search_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+
+@functools.lru_cache(maxsize=1)
+def _registry_client() -> Client:
+    """Shared HTTP client so PyPI/npm lookups reuse pooled connections."""
+    return Client(timeout=10, follow_redirects=True)
+
+
+@functools.lru_cache(maxsize=1)
+def _code_runner():
+    """Shared stateless CodeRunner, imported and built on first run_python."""
+    from tools.code_runner import CodeRunner
+    return CodeRunner()
+
+
+def _fetch_registry_json(url: str) -> Any:
+    """GET a package registry JSON document, raising on HTTP errors."""
+    response = _registry_client().get(url)
+    response.raise_for_status()
+    return response.json()
+
+
+def _count_text_lines(f) -> int:
+    """
+    Count the lines text-mode iteration of binary file f would yield.
+    
+    Works on raw bytes with ``bytes.count`` (a memchr loop), treating
+    ``\n``, ``\r`` and ``\r\n`` as line ends like universal newlines do.
+    Only valid for encodings in _NEWLINE_SAFE_ENCODINGS.
+    """
+    total = 0
+    last = b""
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        total += chunk.count(b"\n")
+        if b"\r" in chunk:
+            total += chunk.count(b"\r") - chunk.count(b"\r\n")
+        if last.endswith(b"\r") and chunk.startswith(b"\n"):
+            total -= 1  # "\r\n" split across chunks is one line end
+        last = chunk
+    if last and not last.endswith((b"\n", b"\r")):
+        total += 1  # final line without a line end
+    return total
+
+
+# (whole UTC second, its isoformat without offset) for _utc_now_iso
+_utc_second_prefix: Tuple[int, str] = (-1, "")
+
+
+def _utc_now_iso() -> str:
+    """
+    Equivalent of ``datetime.now(timezone.utc).isoformat()``.
+
+    The date/time part is formatted once per second; only the microseconds
+    are filled in per call.
+    """
+    global _utc_second_prefix
+    now = time.time()
+    second = int(now)
+    micros = round((now - second) * 1_000_000)
+    if micros == 1_000_000:  # rounds up into the next second, as datetime does
+        second += 1
+        micros = 0
+    cached_second, prefix = _utc_second_prefix
+    if second != cached_second:
+        prefix = datetime.fromtimestamp(second, timezone.utc).isoformat()[:-6]
+        _utc_second_prefix = (second, prefix)
+    if micros:
+        return f"{prefix}.{micros:06d}+00:00"
+    return f"{prefix}+00:00"
+
 
 # ---------------------------------------------------------------------------
 # Exception classes
@@ -78,6 +198,9 @@ class AgentTools:
     All operations are restricted to a designated working directory
     to prevent directory traversal attacks.
     """
+    # Set once a PATH lookup finds the GitHub CLI; shared by all instances
+    _gh_available = False
+    
     def __init__(self, working_dir: str = DEFAULT_WORKING_DIR, max_file_size: int = DEFAULT_MAX_FILE_SIZE):
         """
         Initialize agent tools.
@@ -94,6 +217,15 @@ class AgentTools:
         
         self.working_dir = os.path.abspath(working_dir)
         self.max_file_size = max_file_size
+        self._real_working = os.path.realpath(self.working_dir)
+        # Prefix for descendants; "/" must not become "//"
+        self._real_working_prefix = self._real_working.rstrip(os.sep) + os.sep
+        # real path -> ((mtime_ns, size, encoding), line count) for read_file
+        self._line_counts: Dict[str, Tuple[Tuple[int, int, str], int]] = {}
+        # real path -> ((mtime_ns, size, page_size), page start offsets)
+        self._page_index: Dict[str, Tuple[Tuple[int, int, int], Optional[List[int]]]] = {}
+        # language -> (fetched at, parsed pip list / npm ls output)
+        self._package_listings: Dict[str, Tuple[float, Any]] = {}
         logger.info(f"Initialized AgentTools with working_dir: {self.working_dir}")
     
     def _validate_path(self, path: str) -> str:
@@ -112,21 +244,81 @@ class AgentTools:
         Raises:
             PathError: If path escapes working directory
         """
-        # If absolute path, use it; otherwise, treat as relative to working_dir
-        if os.path.isabs(path):
-            full_path = os.path.abspath(path)
-        else:
-            full_path = os.path.abspath(os.path.join(self.working_dir, path))
+        # working_dir is absolute, so join + normpath matches abspath without
+        # the getcwd() call; an absolute path replaces working_dir in the join
+        full_path = os.path.normpath(os.path.join(self.working_dir, path))
         
-        # Ensure path is within working directory
+        # Ensure path is within working directory (component-wise, so
+        # "/work/dir2" is not accepted as inside "/work/dir"). Resolved
+        # fresh every time: a cached answer goes stale once a path is
+        # swapped for a symlink.
         real_path = os.path.realpath(full_path)
-        real_working = os.path.realpath(self.working_dir)
         
-        if not real_path.startswith(real_working):
+        if real_path != self._real_working and not real_path.startswith(self._real_working_prefix):
             raise PathError(f"Path escapes working directory: {path}")
         
         return real_path
     
+    def _count_lines(self, file_path: str, st: os.stat_result, encoding: str) -> int:
+        """
+        Count lines the way text-mode iteration would, cached per file version.
+        
+        For UTF-8/ASCII files the count is taken on raw bytes (no decoding);
+        other encodings are counted by iterating the decoded text.
+        """
+        key = (st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size, encoding)
+        cached = self._line_counts.get(file_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        if codecs.lookup(encoding).name in _NEWLINE_SAFE_ENCODINGS:
+            with open(file_path, 'rb') as f:
+                total = _count_text_lines(f)
+        else:
+            with open(file_path, 'r', encoding=encoding) as f:
+                total = sum(1 for _ in f)
+        
+        self._line_counts[file_path] = (key, total)
+        return total
+    
+    def _page_offsets(self, file_path: str, st: os.stat_result, page_size: int,
+                      encoding: str) -> Optional[List[int]]:
+        """
+        Byte offset of the start of each page, cached per file version.
+        
+        Lets ``read_file`` jump straight to page N of a large file instead
+        of decoding every earlier page. Returns None when byte offsets
+        cannot stand in for text lines (other encodings, or ``\r`` present).
+        """
+        if codecs.lookup(encoding).name not in _NEWLINE_SAFE_ENCODINGS:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size, page_size)
+        cached = self._page_index.get(file_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        with open(file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b"\r") != -1:
+                offsets = None
+            else:
+                offsets = [0]
+                size = len(mm)
+                find = mm.find
+                pos = 0
+                lines = 0
+                while True:
+                    nl = find(b"\n", pos)
+                    if nl == -1:
+                        break
+                    pos = nl + 1
+                    lines += 1
+                    if lines % page_size == 0 and pos < size:
+                        offsets.append(pos)
+        
+        self._page_index[file_path] = (key, offsets)
+        return offsets
+    
     def list_directory(self, path: str = ".", depth: int = -1) -> Dict[str, Any]:
         """
         List contents of a directory as a recursive tree.
@@ -148,38 +340,35 @@ class AgentTools:
             if not os.path.isdir(dir_path):
                 raise ToolError(f"Not a directory: {path}")
             
-            def _build_tree(current_path: str, current_depth: int) -> Dict[str, Any]:
-                entries = os.listdir(current_path)
+            def _build_tree(current_path: str, current_depth: int) -> Tuple[Dict[str, Any], int]:
+                # scandir's DirEntry.is_dir() uses the d_type from the
+                # directory read, so no per-entry stat for non-symlinks
+                with os.scandir(current_path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
                 directories = []
                 files = []
+                count = 0
                 
-                for entry in sorted(entries):
-                    full_path = os.path.join(current_path, entry)
-                    if os.path.isdir(full_path):
+                for entry in entries:
+                    if entry.is_dir():
+                        count += 1  # count the directory itself
                         if depth == -1 or current_depth < depth:
-                            subtree = _build_tree(full_path, current_depth + 1)
-                            directories.append({"name": entry, **subtree})
+                            subtree, sub_count = _build_tree(entry.path, current_depth + 1)
+                            directories.append({"name": entry.name, **subtree})
+                            count += sub_count
                         else:
-                            directories.append({"name": entry})
+                            directories.append({"name": entry.name})
                     else:
-                        files.append(entry)
+                        files.append(entry.name)
                 
+                count += len(files)
                 return {
                     "directories": directories,
                     "files": files,
-                }
-            
-            tree = _build_tree(dir_path, 0)
+                }, count
             
-            # Count totals recursively
-            def _count(node: Dict[str, Any]) -> int:
-                total = len(node.get("files", []))
-                for d in node.get("directories", []):
-                    total += 1  # count the directory itself
-                    total += _count(d)
-                return total
-            
-            total = _count(tree)
+            # Build the tree and count entries in a single walk
+            tree, total = _build_tree(dir_path, 0)
             
             logger.debug(f"Listed directory tree: {path} ({total} entries)")
             
@@ -222,21 +411,29 @@ class AgentTools:
             if not os.path.isfile(file_path):
                 raise ToolError(f"Not a file: {path}")
             
-            with open(file_path, 'r', encoding=encoding) as f:
-                lines = f.readlines()
-            
-            total_lines = len(lines)
+            st = os.stat(file_path)
+            total_lines = self._count_lines(file_path, st, encoding)
             total_pages = max(1, (total_lines + page_size - 1) // page_size)
             safe_page = max(1, min(page, total_pages))
             start = (safe_page - 1) * page_size
             end = start + page_size
-            content = "".join(lines[start:end])
             
-            # Remove trailing newline added by join for consistency
-            if content.endswith("\n") and total_lines > 0 and not lines[-1].endswith("\n") and end >= total_lines:
-                pass  # keep as-is; file didn't end with newline originally only on last page
+            offsets = None
+            if safe_page > 1 and st.st_size >= MMAP_READ_MIN_SIZE:
+                offsets = self._page_offsets(file_path, st, page_size, encoding)
+            
+            if offsets is not None:
+                # Decode just this page's byte range from the mapped file
+                with open(file_path, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    page_end = offsets[safe_page] if safe_page < len(offsets) else len(mm)
+                    content = mm[offsets[safe_page - 1]:page_end].decode(encoding)
+            else:
+                # Stream up to the requested page; only its lines are kept
+                with open(file_path, 'r', encoding=encoding) as f:
+                    content = "".join(itertools.islice(f, start, end))
             
-            file_size = os.path.getsize(file_path)
+            file_size = st.st_size
             logger.debug(f"Read file: {path} (page {safe_page}/{total_pages}, {file_size} bytes total)")
             
             return {
@@ -252,7 +449,7 @@ class AgentTools:
         except Exception as e:
             raise ToolError(f"Failed to read file {path}: {e}")
     
-    def write_file(self, path: str, content: str, encoding: str = "utf-8") -> Dict[str, Any]:
+    def write_file(self, path: str, content: Union[str, bytes], encoding: str = "utf-8") -> Dict[str, Any]:
         """
         Write content to a file.
         
@@ -260,8 +457,8 @@ class AgentTools:
         
         Args:
             path: File path (relative to working_dir)
-            content: Content to write
-            encoding: Text encoding (default: utf-8)
+            content: Content to write; bytes are written as-is
+            encoding: Text encoding (default: utf-8, ignored for bytes)
             
         Returns:
             Dictionary with path, size, and created flag
@@ -277,21 +474,14 @@ class AgentTools:
             parent_dir = os.path.dirname(file_path)
             os.makedirs(parent_dir, exist_ok=True)
             
-            # Check if file already exists
-            already_exists = os.path.exists(file_path)
+            created, file_size = self._write_content(file_path, content, encoding)
             
-            # Write file
-            with open(file_path, 'w', encoding=encoding) as f:
-                f.write(content)
-            
-            file_size = os.path.getsize(file_path)
-            
-            logger.info(f"Wrote file: {path} ({file_size} bytes, created={not already_exists})")
+            logger.info(f"Wrote file: {path} ({file_size} bytes, created={created})")
             
             return {
                 "path": path,
                 "size": file_size,
-                "created": not already_exists,
+                "created": created,
                 "encoding": encoding,
             }
         
@@ -300,6 +490,132 @@ class AgentTools:
         except Exception as e:
             raise ToolError(f"Failed to write file {path}: {e}")
     
+    def write_files(self, files: List[Tuple[str, Union[str, bytes]]],
+                    encoding: str = "utf-8") -> Dict[str, Any]:
+        """
+        Write several files in one call.
+        
+        Every path is validated before anything is written, and each parent
+        directory is created once however many files land in it.
+        
+        Args:
+            files: (path, content) pairs, written in order
+            encoding: Text encoding (default: utf-8)
+            
+        Returns:
+            Dictionary with a write_file-style result per file and the count
+            
+        Raises:
+            PathError: If any path is invalid
+            ToolError: If a write fails
+        """
+        targets = [(path, self._validate_path(path), content) for path, content in files]
+        
+        try:
+            for parent_dir in {os.path.dirname(file_path) for _, file_path, _ in targets}:
+                os.makedirs(parent_dir, exist_ok=True)
+            
+            results = []
+            for path, file_path, content in targets:
+                created, file_size = self._write_content(file_path, content, encoding)
+                results.append({
+                    "path": path,
+                    "size": file_size,
+                    "created": created,
+                    "encoding": encoding,
+                })
+            
+            logger.info(f"Wrote {len(results)} files")
+            
+            return {
+                "files": results,
+                "total": len(results),
+            }
+        
+        except Exception as e:
+            raise ToolError(f"Failed to write files: {e}")
+    
+    @staticmethod
+    def _write_content(file_path: str, content: Union[str, bytes], encoding: str) -> Tuple[bool, int]:
+        """
+        Atomically replace file_path with content; returns (created, size).
+        
+        The content goes to a temporary file beside the target which is then
+        renamed over it, so concurrent readers see the old file or the new
+        one, never a truncated one. An existing file must be writable, as
+        with an in-place open(); its permission bits, ownership and extended
+        attributes (ACLs included) are carried over where the platform and
+        privileges allow. A file with several hard links is rewritten in
+        place so the links stay shared. Bytes-like content is written with
+        no encode.
+        """
+        binary = isinstance(content, (bytes, bytearray, memoryview))
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            st = None
+        
+        if st is not None:
+            # The rename below only needs write access to the directory
+            if not os.access(file_path, os.W_OK):
+                raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), file_path)
+            if st.st_nlink > 1:
+                if binary:
+                    f = open(file_path, 'wb')
+                else:
+                    f = open(file_path, 'w', encoding=encoding)
+                with f:
+                    f.write(content)
+                    f.flush()
+                    size = os.fstat(f.fileno()).st_size
+                return False, size
+        
+        parent_dir, name = os.path.split(file_path)
+        tmp_path = os.path.join(parent_dir, f".{name}.{secrets.token_hex(4)}.tmp")
+        # 0o666 leaves new-file permissions to the umask, as open() does
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            if binary:
+                f = os.fdopen(fd, 'wb')
+            else:
+                f = os.fdopen(fd, 'w', encoding=encoding)
+            with f:
+                f.write(content)
+                f.flush()
+                size = os.fstat(f.fileno()).st_size
+            if st is not None:
+                AgentTools._copy_file_metadata(file_path, tmp_path, st)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        return st is None, size
+    
+    @staticmethod
+    def _copy_file_metadata(src: str, dst: str, st: os.stat_result) -> None:
+        """Give dst src's mode, and best effort its owner and xattrs."""
+        # chown first: it clears setuid/setgid bits that chmod then restores
+        if hasattr(os, "chown"):
+            try:
+                os.chown(dst, st.st_uid, st.st_gid)
+            except OSError:
+                pass  # only root may give a file away
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+        if hasattr(os, "listxattr"):
+            try:
+                attrs = os.listxattr(src)
+            except OSError:
+                attrs = []  # filesystem without xattr support
+            for attr in attrs:
+                try:
+                    os.setxattr(dst, attr, os.getxattr(src, attr))
+                except OSError:
+                    pass  # e.g. a security.* attribute needing privileges
+    
     def edit_file(self, path: str, diff: str, encoding: str = "utf-8") -> Dict[str, Any]:
         """
         Edit file by applying a unified diff.
@@ -339,8 +655,7 @@ class AgentTools:
                 }
             
             # Write back
-            with open(file_path, 'w', encoding=encoding) as f:
-                f.write("".join(new_lines))
+            self._write_content(file_path, "".join(new_lines), encoding)
             
             logger.info(
                 f"Edited file: {path} (hunks={stats['hunks']}, added={stats['added']}, removed={stats['removed']})"
@@ -374,6 +689,8 @@ class AgentTools:
             stats includes: hunks, added, removed
         """
         diff_lines = diff.splitlines()
+        num_diff_lines = len(diff_lines)
+        num_original = len(original_lines)
         output_lines: List[str] = []
         orig_index = 0
         hunks = 0
@@ -381,7 +698,7 @@ class AgentTools:
         removed = 0
         
         i = 0
-        while i < len(diff_lines):
+        while i < num_diff_lines:
             line = diff_lines[i]
             
             if line.startswith("diff ") or line.startswith("---") or line.startswith("+++"):
@@ -389,35 +706,37 @@ class AgentTools:
                 continue
             
             if line.startswith("@@"):
-                match = re.match(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", line)
+                match = _HUNK_HEADER_RE.match(line)
                 if not match:
                     raise ToolError(f"Invalid diff hunk header: {line}")
                 orig_start = int(match.group(1))
                 
-                # Append unchanged lines before the hunk
-                while orig_index < orig_start - 1:
-                    output_lines.append(original_lines[orig_index])
-                    orig_index += 1
+                # Append unchanged lines before the hunk in one slice
+                hunk_index = orig_start - 1
+                if hunk_index > num_original:
+                    raise ToolError(f"Diff hunk starts past end of file: {line}")
+                if hunk_index > orig_index:
+                    output_lines.extend(original_lines[orig_index:hunk_index])
+                    orig_index = hunk_index
                 
                 i += 1
-                while i < len(diff_lines) and not diff_lines[i].startswith("@@"):
+                while i < num_diff_lines and not diff_lines[i].startswith("@@"):
                     hunk_line = diff_lines[i]
-                    if hunk_line.startswith(" "):
-                        expected = hunk_line[1:]
-                        if orig_index >= len(original_lines) or original_lines[orig_index].rstrip("\n") != expected:
+                    first = hunk_line[:1]
+                    if first == " ":
+                        if orig_index >= num_original or original_lines[orig_index].rstrip("\n") != hunk_line[1:]:
                             raise ToolError("Diff context does not match file contents")
                         output_lines.append(original_lines[orig_index])
                         orig_index += 1
-                    elif hunk_line.startswith("-"):
-                        expected = hunk_line[1:]
-                        if orig_index >= len(original_lines) or original_lines[orig_index].rstrip("\n") != expected:
+                    elif first == "-":
+                        if orig_index >= num_original or original_lines[orig_index].rstrip("\n") != hunk_line[1:]:
                             raise ToolError("Diff removal does not match file contents")
                         orig_index += 1
                         removed += 1
-                    elif hunk_line.startswith("+"):
+                    elif first == "+":
                         output_lines.append(hunk_line[1:] + "\n")
                         added += 1
-                    elif hunk_line.startswith("\\"):
+                    elif first == "\\":
                         if output_lines:
                             output_lines[-1] = output_lines[-1].rstrip("\n")
                     else:
@@ -434,6 +753,36 @@ class AgentTools:
         
         return output_lines, {"hunks": hunks, "added": added, "removed": removed}
     
+    @staticmethod
+    def _glob(dir_path: str, pattern: str) -> List[str]:
+        """
+        Recursive glob of pattern under dir_path.
+        
+        A leading ``**/`` is split across the top-level subdirectories so
+        each subtree is walked on its own thread; the directory scans
+        release the GIL. Matches directly under dir_path come from globbing
+        the remainder of the pattern there.
+        """
+        full_pattern = os.path.join(dir_path, pattern)
+        if not pattern.startswith("**/"):
+            return glob(full_pattern, recursive=True)
+        
+        # "**" skips hidden directories, so they are not walked here either
+        with os.scandir(dir_path) as it:
+            subdirs = [entry.name for entry in it
+                       if not entry.name.startswith(".") and entry.is_dir()]
+        if len(subdirs) < 2:
+            return glob(full_pattern, recursive=True)
+        
+        def walk(name: str) -> List[str]:
+            return glob(os.path.join(dir_path, glob_escape(name), pattern), recursive=True)
+        
+        matches = glob(os.path.join(dir_path, pattern[3:]), recursive=True)
+        with ThreadPoolExecutor(max_workers=min(SEARCH_MAX_WORKERS, len(subdirs))) as pool:
+            for found in pool.map(walk, subdirs):
+                matches.extend(found)
+        return matches
+    
     def search_files(self, pattern: str, path: str = ".") -> Dict[str, Any]:
         """
         Search for files matching a pattern.
@@ -457,29 +806,24 @@ class AgentTools:
             if not os.path.isdir(dir_path):
                 raise ToolError(f"Not a directory: {path}")
             
-            from glob import glob
-            
-            # Build full pattern
-            full_pattern = os.path.join(dir_path, pattern)
-            matches = glob(full_pattern, recursive=True)
+            candidates = sorted(
+                (os.path.relpath(match, self.working_dir), match)
+                for match in self._glob(dir_path, pattern)
+            )
             
-            # Validate all matches are within working directory
+            # Validate matches in result order, only until the cap is hit
             valid_matches = []
-            for match in matches:
+            truncated = False
+            for rel_path, match in candidates:
                 try:
                     self._validate_path(match)
-                    valid_matches.append(os.path.relpath(match, self.working_dir))
                 except PathError:
                     logger.warning(f"Skipping invalid match: {match}")
-            
-            valid_matches.sort()
-            
-            # Limit results
-            if len(valid_matches) > DEFAULT_MAX_SEARCH_RESULTS:
-                valid_matches = valid_matches[:DEFAULT_MAX_SEARCH_RESULTS]
-                truncated = True
-            else:
-                truncated = False
+                    continue
+                if len(valid_matches) == DEFAULT_MAX_SEARCH_RESULTS:
+                    truncated = True
+                    break
+                valid_matches.append(rel_path)
             
             logger.debug(f"Searched for {pattern} in {path} ({len(valid_matches)} matches)")
             
@@ -513,27 +857,30 @@ class AgentTools:
         try:
             full_path = self._validate_path(path)
             
-            if not os.path.exists(full_path):
+            # One stat answers exists/is_file/is_dir as well as the metadata
+            try:
+                stat_info = os.stat(full_path)
+            except FileNotFoundError:
                 raise ToolError(f"Path does not exist: {path}")
-            
-            stat_info = os.stat(full_path)
+            is_file = stat.S_ISREG(stat_info.st_mode)
+            is_dir = stat.S_ISDIR(stat_info.st_mode)
             
             info = {
                 "path": path,
                 "exists": True,
-                "is_file": os.path.isfile(full_path),
-                "is_dir": os.path.isdir(full_path),
+                "is_file": is_file,
+                "is_dir": is_dir,
                 "size": stat_info.st_size,
                 "modified": stat_info.st_mtime,
                 "permissions": oct(stat_info.st_mode)[-3:],
             }
             
             # Add file-specific info
-            if os.path.isfile(full_path):
-                info["lines"] = sum(1 for _ in open(full_path, 'r', encoding='utf-8', errors='ignore'))
+            if is_file:
+                info["lines"] = self._count_lines(full_path, stat_info, "utf-8")
             
             # Add directory-specific info
-            if os.path.isdir(full_path):
+            if is_dir:
                 try:
                     entries = os.listdir(full_path)
                     info["entry_count"] = len(entries)
@@ -605,17 +952,37 @@ class AgentTools:
                 raise ToolError(f"Not a directory: {path}")
             
             all_files = []
-            
-            for root, dirs, files in os.walk(dir_path):
-                for file in files:
-                    # Check extension filter
-                    if extensions:
-                        if not any(file.endswith(ext) for ext in extensions):
+            # str.endswith takes a tuple, so the filter is one C-level call
+            suffixes = tuple(extensions) if extensions else None
+            
+            # Iterative scandir walk; like os.walk, symlinked directories
+            # are not descended into and unreadable directories are skipped
+            stack = [dir_path]
+            while stack:
+                current = stack.pop()
+                try:
+                    it = os.scandir(current)
+                except OSError:
+                    continue
+                # Relative prefix is worked out once per directory, not per file
+                rel_dir = os.path.relpath(current, self.working_dir)
+                rel_prefix = "" if rel_dir == "." else rel_dir + os.sep
+                with it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            if not entry.is_symlink():
+                                stack.append(entry.path)
                             continue
-                    
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, self.working_dir)
-                    all_files.append(rel_path)
+                        
+                        # Check extension filter
+                        if suffixes and not entry.name.endswith(suffixes):
+                            continue
+                        
+                        all_files.append(rel_prefix + entry.name)
             
             all_files.sort()
             
@@ -649,11 +1016,23 @@ class AgentTools:
         """
         try:
             if language.lower() == "python":
-                return self._search_python_package(name)
+                search = self._search_python_package
+                cache_key = ("python", name)
             elif language.lower() in ["javascript", "js", "node"]:
-                return self._search_npm_package(name)
+                search = self._search_npm_package
+                cache_key = ("javascript", name)
             else:
                 raise PackageError(f"Unsupported language: {language}")
+            
+            cached = _package_search_cache.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < PACKAGE_SEARCH_TTL:
+                return dict(cached[1])
+            
+            result = search(name)
+            # Failures are usually transient, so only hits are remembered
+            if result.get("found"):
+                _package_search_cache[cache_key] = (time.monotonic(), result)
+            return dict(result)
         except PackageError:
             raise
         except Exception as e:
@@ -662,13 +1041,8 @@ class AgentTools:
     def _search_python_package(self, name: str) -> Dict[str, Any]:
         """Search for a Python package on PyPI."""
         try:
-            import urllib.request
-            import json as json_module
-            
             # Query PyPI JSON API
-            url = f"https://pypi.org/pypi/{name}/json"
-            with urllib.request.urlopen(url, timeout=10) as response:
-                data = json_module.loads(response.read().decode('utf-8'))
+            data = _fetch_registry_json(f"https://pypi.org/pypi/{name}/json")
             
             package_info = data.get('info', {})
             releases = data.get('releases', {})
@@ -696,13 +1070,8 @@ class AgentTools:
     def _search_npm_package(self, name: str) -> Dict[str, Any]:
         """Search for an npm package."""
         try:
-            import urllib.request
-            import json as json_module
-            
             # Query npm registry
-            url = f"https://registry.npmjs.org/{name}"
-            with urllib.request.urlopen(url, timeout=10) as response:
-                data = json_module.loads(response.read().decode('utf-8'))
+            data = _fetch_registry_json(f"https://registry.npmjs.org/{name}")
             
             latest_version = data.get('dist-tags', {}).get('latest', 'unknown')
             versions = list(data.get('versions', {}).keys())
@@ -742,50 +1111,87 @@ class AgentTools:
         Raises:
             PackageError: If installation fails
         """
+        return self.install_packages([(name, version)], language)["packages"][0]
+    
+    def install_packages(self, packages: List[Tuple[str, Optional[str]]],
+                         language: str = "python") -> Dict[str, Any]:
+        """
+        Install several packages with a single pip/npm invocation.
+        
+        One resolver run installs them all, which is quicker than one run
+        per package and, unlike concurrent runs, safe for a shared
+        environment or node_modules.
+        
+        Args:
+            packages: (name, version) pairs; version may be None for latest
+            language: Programming language ('python', 'javascript', etc.)
+            
+        Returns:
+            Dictionary with an install_package-style result per package
+            
+        Raises:
+            PackageError: If any name is invalid or installation fails
+        """
+        if not packages:
+            raise PackageError("No packages to install")
+        label = ", ".join(name for name, _ in packages)
         try:
             if language.lower() == "python":
-                return self._install_python_package(name, version)
+                return self._install_python_packages(packages)
             elif language.lower() in ["javascript", "js", "node"]:
-                return self._install_npm_package(name, version)
+                return self._install_npm_packages(packages)
             else:
                 raise PackageError(f"Unsupported language: {language}")
         except PackageError:
             raise
         except Exception as e:
-            raise PackageError(f"Failed to install package '{name}': {e}")
+            raise PackageError(f"Failed to install package '{label}': {e}")
     
-    def _install_python_package(self, name: str, version: Optional[str] = None) -> Dict[str, Any]:
-        """Install a Python package using pip."""
+    def _install_python_packages(self, packages: List[Tuple[str, Optional[str]]]) -> Dict[str, Any]:
+        """Install Python packages using one pip run."""
+        label = ", ".join(name for name, _ in packages)
         try:
-            # Validate package name (basic security check)
-            if not self._validate_package_name(name):
-                raise PackageError(f"Invalid package name: {name}")
-            
-            # Build package spec
-            if version:
-                package_spec = f"{name}=={version}" if not any(c in version for c in "=!<>~") else f"{name}{version}"
-            else:
-                package_spec = name
+            package_specs = []
+            for name, version in packages:
+                # Validate package name (basic security check)
+                if not self._validate_package_name(name):
+                    raise PackageError(f"Invalid package name: {name}")
+                
+                # Build package spec
+                if version:
+                    package_specs.append(f"{name}=={version}" if not any(c in version for c in "=!<>~") else f"{name}{version}")
+                else:
+                    package_specs.append(name)
             
-            logger.info(f"Installing Python package: {package_spec}")
+            logger.info(f"Installing Python package: {' '.join(package_specs)}")
             
             # Install using pip
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "--quiet", package_spec],
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
+            try:
+                result = subprocess.run(
+                    [*_PIP_COMMAND, "install", "--quiet", *package_specs],
+                    capture_output=True,
+                    text=True,
+                    timeout=120
+                )
+            finally:
+                self._package_listings.pop("python", None)
             
             if result.returncode == 0:
                 # Verify installation
-                installed = self.check_package_installed(name, language="python")
+                installed = self.check_packages_installed([name for name, _ in packages], language="python")
                 return {
                     "language": "python",
-                    "package": name,
-                    "version": version or "latest",
+                    "packages": [
+                        {
+                            "language": "python",
+                            "package": name,
+                            "version": version or "latest",
+                            "success": True,
+                            "installed_version": installed[name].get("installed_version"),
+                        }
+                        for name, version in packages
+                    ],
                     "success": True,
-                    "installed_version": installed.get("installed_version"),
                 }
             else:
                 error_msg = result.stderr or result.stdout
@@ -794,42 +1200,64 @@ class AgentTools:
         except PackageError:
             raise
         except subprocess.TimeoutExpired:
-            raise PackageError(f"Installation timeout for {name}")
+            raise PackageError(f"Installation timeout for {label}")
         except Exception as e:
-            raise PackageError(f"Failed to install Python package '{name}': {e}")
+            raise PackageError(f"Failed to install Python package '{label}': {e}")
     
-    def _install_npm_package(self, name: str, version: Optional[str] = None) -> Dict[str, Any]:
-        """Install an npm package."""
+    def _install_npm_packages(self, packages: List[Tuple[str, Optional[str]]]) -> Dict[str, Any]:
+        """Install npm packages using one npm run."""
+        label = ", ".join(name for name, _ in packages)
         try:
-            # Validate package name
-            if not self._validate_package_name(name):
-                raise PackageError(f"Invalid package name: {name}")
-            
-            # Build package spec
-            if version:
-                package_spec = f"{name}@{version}"
-            else:
-                package_spec = name
+            package_specs = []
+            for name, version in packages:
+                # Validate package name
+                if not self._validate_package_name(name):
+                    raise PackageError(f"Invalid package name: {name}")
+                
+                # Build package spec
+                if version:
+                    package_specs.append(f"{name}@{version}")
+                else:
+                    package_specs.append(name)
             
-            logger.info(f"Installing npm package: {package_spec}")
+            logger.info(f"Installing npm package: {' '.join(package_specs)}")
             
             # Try npm first, fall back to yarn if available
-            result = subprocess.run(
-                ["npm", "install", "--silent", "--save", package_spec],
-                capture_output=True,
-                text=True,
-                timeout=120,
-                cwd=self.working_dir
-            )
+            try:
+                result = subprocess.run(
+                    ["npm", "install", "--silent", "--save", *package_specs],
+                    capture_output=True,
+                    text=True,
+                    timeout=120,
+                    cwd=self.working_dir
+                )
+            finally:
+                self._package_listings.pop("javascript", None)
             
             if result.returncode == 0:
-                installed = self.check_package_installed(name, language="javascript")
+                # npm has just written node_modules/<name>/package.json, so
+                # read versions there; only unreadable ones go through npm ls
+                installed = {}
+                for name, _ in packages:
+                    version = self._read_npm_package_version(name)
+                    if version is not None:
+                        installed[name] = {"installed_version": version}
+                missing = [name for name, _ in packages if name not in installed]
+                if missing:
+                    installed.update(self.check_packages_installed(missing, language="javascript"))
                 return {
                     "language": "javascript",
-                    "package": name,
-                    "version": version or "latest",
+                    "packages": [
+                        {
+                            "language": "javascript",
+                            "package": name,
+                            "version": version or "latest",
+                            "success": True,
+                            "installed_version": installed[name].get("installed_version"),
+                        }
+                        for name, version in packages
+                    ],
                     "success": True,
-                    "installed_version": installed.get("installed_version"),
                 }
             else:
                 error_msg = result.stderr or result.stdout
@@ -838,11 +1266,21 @@ class AgentTools:
         except PackageError:
             raise
         except subprocess.TimeoutExpired:
-            raise PackageError(f"Installation timeout for {name}")
+            raise PackageError(f"Installation timeout for {label}")
         except FileNotFoundError:
             raise PackageError("npm not found. Please install Node.js to use npm packages.")
         except Exception as e:
-            raise PackageError(f"Failed to install npm package '{name}': {e}")
+            raise PackageError(f"Failed to install npm package '{label}': {e}")
+    
+    def _read_npm_package_version(self, name: str) -> Optional[str]:
+        """Version from an installed package's own package.json, or None."""
+        manifest = os.path.join(self.working_dir, "node_modules", name, "package.json")
+        try:
+            with open(manifest, 'rb') as f:
+                version = json.load(f).get("version")
+        except (OSError, ValueError, AttributeError):
+            return None
+        return version if isinstance(version, str) else None
     
     def check_package_installed(self, name: str, language: str = "python") -> Dict[str, Any]:
         """
@@ -855,106 +1293,111 @@ class AgentTools:
         Returns:
             Dictionary with installed status and version
         """
+        return self.check_packages_installed([name], language)[name]
+    
+    def check_packages_installed(self, names: List[str], language: str = "python") -> Dict[str, Dict[str, Any]]:
+        """
+        Check several packages with a single pip/npm invocation.
+        
+        Args:
+            names: Package names to check
+            language: Programming language ('python', 'javascript', etc.)
+            
+        Returns:
+            Mapping of each name to a check_package_installed-style result
+        """
         try:
             if language.lower() == "python":
-                return self._check_python_package(name)
+                return self._check_python_packages(names)
             elif language.lower() in ["javascript", "js", "node"]:
-                return self._check_npm_package(name)
+                return self._check_npm_packages(names)
             else:
                 raise PackageError(f"Unsupported language: {language}")
         except Exception as e:
             return {
-                "name": name,
-                "language": language,
-                "installed": False,
-                "error": str(e),
+                name: {
+                    "name": name,
+                    "language": language,
+                    "installed": False,
+                    "error": str(e),
+                }
+                for name in names
             }
     
-    def _check_python_package(self, name: str) -> Dict[str, Any]:
-        """Check if a Python package is installed."""
-        try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "show", name],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                # Parse pip show output
-                info = {}
-                for line in result.stdout.split('\n'):
-                    if ':' in line:
-                        key, value = line.split(':', 1)
-                        info[key.strip().lower()] = value.strip()
-                
-                return {
+    def _check_python_packages(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Check Python packages from their installed metadata.
+        
+        pip installs into this interpreter's environment, so reading the
+        dist-info in-process answers the same question as ``pip show``
+        without starting a second interpreter.
+        """
+        results = {}
+        for name in names:
+            try:
+                dist = importlib.metadata.distribution(name)
+            except importlib.metadata.PackageNotFoundError:
+                results[name] = {
                     "name": name,
                     "language": "python",
-                    "installed": True,
-                    "installed_version": info.get('version', 'unknown'),
-                    "location": info.get('location', ''),
+                    "installed": False,
                 }
-            else:
-                return {
+            except Exception as e:
+                logger.debug(f"Failed to check Python package '{name}': {e}")
+                results[name] = {
                     "name": name,
                     "language": "python",
                     "installed": False,
+                    "error": str(e),
                 }
-        except Exception as e:
-            logger.debug(f"Failed to check Python package '{name}': {e}")
-            return {
-                "name": name,
-                "language": "python",
-                "installed": False,
-                "error": str(e),
-            }
+            else:
+                results[name] = {
+                    "name": name,
+                    "language": "python",
+                    "installed": True,
+                    "installed_version": dist.version or 'unknown',
+                    "location": str(dist.locate_file('')),
+                }
+        return results
     
-    def _check_npm_package(self, name: str) -> Dict[str, Any]:
-        """Check if an npm package is installed."""
+    def _check_npm_packages(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Check npm packages against one ``npm ls`` of the working directory."""
         try:
-            result = subprocess.run(
-                ["npm", "ls", name, "--depth=0"],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=self.working_dir
-            )
-            
-            if result.returncode == 0 and f"{name}@" in result.stdout:
-                # Parse version from output like: "package@1.2.3"
-                for line in result.stdout.split('\n'):
-                    if name in line and '@' in line:
-                        parts = line.split('@')
-                        if len(parts) >= 2:
-                            version = parts[-1].strip()
-                            return {
-                                "name": name,
-                                "language": "javascript",
-                                "installed": True,
-                                "installed_version": version,
-                            }
-            
-            return {
-                "name": name,
-                "language": "javascript",
-                "installed": False,
-            }
+            dependencies = self._npm_dependencies()
         except FileNotFoundError:
-            return {
-                "name": name,
-                "language": "javascript",
-                "installed": False,
-                "error": "npm not found",
-            }
+            error = "npm not found"
         except Exception as e:
-            logger.debug(f"Failed to check npm package '{name}': {e}")
-            return {
+            logger.debug(f"Failed to check npm packages {names}: {e}")
+            error = str(e)
+        else:
+            results = {}
+            for name in names:
+                info = dependencies.get(name)
+                # Declared-but-missing dependencies are listed without a version
+                if info and info.get("version") and not info.get("missing"):
+                    results[name] = {
+                        "name": name,
+                        "language": "javascript",
+                        "installed": True,
+                        "installed_version": info["version"],
+                    }
+                else:
+                    results[name] = {
+                        "name": name,
+                        "language": "javascript",
+                        "installed": False,
+                    }
+            return results
+        
+        return {
+            name: {
                 "name": name,
                 "language": "javascript",
                 "installed": False,
-                "error": str(e),
+                "error": error,
             }
+            for name in names
+        }
     
     def list_installed_packages(self, language: str = "python") -> Dict[str, Any]:
         """
@@ -981,63 +1424,93 @@ class AgentTools:
                 "error": str(e),
             }
     
+    def _cached_listing(self, language: str) -> Optional[Any]:
+        """Return a package listing fetched within INSTALLED_PACKAGES_TTL, if any."""
+        cached = self._package_listings.get(language)
+        if cached is not None and time.monotonic() - cached[0] < INSTALLED_PACKAGES_TTL:
+            return cached[1]
+        return None
+    
     def _list_python_packages(self) -> Dict[str, Any]:
         """List installed Python packages."""
-        try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "list", "--format=json"],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
+        packages = self._cached_listing("python")
+        if packages is None:
+            try:
+                # Raw bytes go straight to json.loads, which decodes UTF-8
+                # itself; text=True would decode once more beforehand
+                result = subprocess.run(
+                    [*_PIP_COMMAND, "list", "--format=json"],
+                    capture_output=True,
+                    timeout=30
+                )
+                
+                if result.returncode != 0:
+                    raise PackageError("pip list failed")
                 packages = json.loads(result.stdout)
-                return {
-                    "language": "python",
-                    "packages": packages,
-                    "count": len(packages),
-                }
-            else:
-                raise PackageError("pip list failed")
-        except json.JSONDecodeError:
-            raise PackageError("Failed to parse pip list output")
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise PackageError("Failed to parse pip list output")
+            self._package_listings["python"] = (time.monotonic(), packages)
+        
+        return {
+            "language": "python",
+            "packages": list(packages),
+            "count": len(packages),
+        }
     
     def _list_npm_packages(self) -> Dict[str, Any]:
         """List installed npm packages."""
         try:
-            result = subprocess.run(
-                ["npm", "ls", "--depth=0", "--json"],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=self.working_dir
-            )
-            
-            if result.returncode in [0, 1]:  # npm ls returns 1 if packages missing, but still has output
-                data = json.loads(result.stdout)
-                packages = data.get('dependencies', {})
-                
-                package_list = [
-                    {"name": name, "version": info.get("version", "unknown")}
-                    for name, info in packages.items()
-                ]
-                
-                return {
-                    "language": "javascript",
-                    "packages": package_list,
-                    "count": len(package_list),
-                }
-            else:
-                raise PackageError("npm ls failed")
+            packages = self._npm_dependencies()
         except FileNotFoundError:
             return {
                 "language": "javascript",
                 "packages": [],
                 "error": "npm not found",
             }
-        except json.JSONDecodeError:
+        
+        package_list = [
+            {"name": name, "version": info.get("version", "unknown")}
+            for name, info in packages.items()
+        ]
+        
+        return {
+            "language": "javascript",
+            "packages": package_list,
+            "count": len(package_list),
+        }
+    
+    def _npm_dependencies(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Top-level dependencies from ``npm ls --depth=0 --json``.
+        
+        Reused for INSTALLED_PACKAGES_TTL seconds, so a check following a
+        listing (or several checks in a row) share one npm run.
+        
+        Raises:
+            FileNotFoundError: If npm is not installed
+            PackageError: If npm ls fails or its output cannot be parsed
+        """
+        dependencies = self._cached_listing("javascript")
+        if dependencies is not None:
+            return dependencies
+        
+        # Raw bytes go straight to json.loads, as in _list_python_packages
+        result = subprocess.run(
+            ["npm", "ls", "--depth=0", "--json"],
+            capture_output=True,
+            timeout=30,
+            cwd=self.working_dir
+        )
+        
+        if result.returncode not in [0, 1]:  # npm ls returns 1 if packages missing, but still has output
+            raise PackageError("npm ls failed")
+        try:
+            dependencies = json.loads(result.stdout).get('dependencies', {})
+        except (json.JSONDecodeError, UnicodeDecodeError):
             raise PackageError("Failed to parse npm ls output")
+        
+        self._package_listings["javascript"] = (time.monotonic(), dependencies)
+        return dependencies
     
     @staticmethod
     def _validate_package_name(name: str) -> bool:
@@ -1050,20 +1523,9 @@ class AgentTools:
         Returns:
             True if valid, False otherwise
         """
-        # Reject obviously malicious patterns
-        if not name or not isinstance(name, str):
-            return False
-        
-        # Reject paths and shell commands
-        if any(c in name for c in ['/', '\\', ';', '|', '&', '`', '$']):
-            return False
-        
-        # Allow alphanumeric, hyphens, underscores, dots
-        import re as re_mod
-        if not re_mod.match(r'^[\w\-\.]+$', name):
-            return False
-        
-        return True
+        # Only alphanumerics, hyphens, underscores and dots, which also rules
+        # out path separators and shell metacharacters
+        return isinstance(name, str) and _PACKAGE_NAME_RE.fullmatch(name) is not None
     
     # ------------------------------------------------------------------
     # Code execution
@@ -1087,14 +1549,11 @@ class AgentTools:
             PathError: If log_path escapes working directory
             ToolError: If execution setup fails
         """
-        from tools.code_runner import CodeRunner
-
         abs_log = None
         if log_path:
             abs_log = self._validate_path(log_path)
 
-        runner = CodeRunner()
-        result = runner.run_python(
+        result = _code_runner().run_python(
             code, cwd=self.working_dir, timeout=timeout, log_path=abs_log,
         )
         result["success"] = result.get("exit_code") == 0
@@ -1179,7 +1638,7 @@ class AgentTools:
             GitError: Not a git repository
         """
         # Validate branch name
-        if not re.match(r'^[\w\-/\.]+$', branch_name):
+        if not _BRANCH_NAME_RE.match(branch_name):
             raise ToolError(f"Invalid branch name: {branch_name}")
 
         abs_repo = self._validate_path(repo_dir)
@@ -1222,6 +1681,8 @@ class AgentTools:
         if not os.path.isdir(os.path.join(abs_repo, ".git")):
             raise GitError(f"Not a git repository: {repo_dir}")
 
+        if branch_name is None:
+            branch_name = self._read_head_branch(abs_repo)
         if branch_name is None:
             res = subprocess.run(
                 ["git", "rev-parse", "--abbrev-ref", "HEAD"],
@@ -1248,6 +1709,25 @@ class AgentTools:
 
         return {"success": True, "branch_name": branch_name, "remote": remote}
 
+    @staticmethod
+    def _read_head_branch(abs_repo: str) -> Optional[str]:
+        """
+        Current branch name read straight from ``.git/HEAD``.
+        
+        Saves spawning ``git rev-parse`` for the usual "ref: refs/heads/..."
+        case. Returns None when HEAD is detached, unreadable or a reftable
+        placeholder, leaving those to git.
+        """
+        try:
+            with open(os.path.join(abs_repo, ".git", "HEAD"), 'r', encoding='utf-8') as f:
+                head = f.read().strip()
+        except OSError:
+            return None
+        prefix = "ref: refs/heads/"
+        if not head.startswith(prefix) or head == prefix + ".invalid":
+            return None
+        return head[len(prefix):]
+
     def create_pull_request(
         self,
         repo_dir: str,
@@ -1274,21 +1754,21 @@ class AgentTools:
         if not os.path.isdir(os.path.join(abs_repo, ".git")):
             raise GitError(f"Not a git repository: {repo_dir}")
 
-        # Check gh availability
-        try:
-            subprocess.run(
-                ["gh", "--version"],
-                capture_output=True, text=True, timeout=10,
-            )
-        except FileNotFoundError:
-            raise GitError("GitHub CLI (gh) is not installed")
+        # Check gh availability with a PATH lookup; once found it is
+        # remembered for the process, a miss is rechecked next time
+        if not AgentTools._gh_available:
+            AgentTools._gh_available = shutil.which("gh") is not None
+            if not AgentTools._gh_available:
+                raise GitError("GitHub CLI (gh) is not installed")
 
         # Current branch
-        res = subprocess.run(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"],
-            cwd=abs_repo, capture_output=True, text=True, timeout=10,
-        )
-        head_branch = res.stdout.strip()
+        head_branch = self._read_head_branch(abs_repo)
+        if head_branch is None:
+            res = subprocess.run(
+                ["git", "rev-parse", "--abbrev-ref", "HEAD"],
+                cwd=abs_repo, capture_output=True, text=True, timeout=10,
+            )
+            head_branch = res.stdout.strip()
 
         cmd = ["gh", "pr", "create", "--head", head_branch]
         if base_branch:
@@ -1304,6 +1784,9 @@ class AgentTools:
             result = subprocess.run(
                 cmd, cwd=abs_repo, capture_output=True, text=True, timeout=60,
             )
+        except FileNotFoundError:
+            AgentTools._gh_available = False
+            raise GitError("GitHub CLI (gh) is not installed")
         except subprocess.CalledProcessError as exc:
             raise GitError(f"gh pr create failed: {exc.stderr.strip()}")
 
@@ -1333,361 +1816,166 @@ def get_tools(working_dir: str = DEFAULT_WORKING_DIR) -> AgentTools:
 # Tool definitions – OpenAI JSON Schema format
 # ---------------------------------------------------------------------------
 
-TOOL_DEFINITIONS: Dict[str, Any] = {
-    "assign_task": {
-        "type": "function",
-        "function": {
-            "name": "assign_task",
-            "description": "Assign a single task to a specific role",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "role": {
-                        "type": "string",
-                        "description": "The role to assign the task to (e.g., 'developer', 'auditor')"
-                    },
-                    "task": {
-                        "type": "string",
-                        "description": "Detailed task description including context and dependencies"
-                    },
-                    "sequence": {
-                        "type": "integer",
-                        "description": "Execution order: 0 for first, 1 for second, etc. Same sequence runs in parallel."
-                    }
-                },
-                "required": ["role", "task", "sequence"]
-            }
-        }
-    },
-    "assign_tasks": {
-        "type": "function",
-        "function": {
-            "name": "assign_tasks",
-            "description": "Assign multiple tasks at once for batch processing",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "assignments": {
-                        "type": "array",
-                        "description": "List of task assignments",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "role": {"type": "string", "description": "The role to assign the task to"},
-                                "task": {"type": "string", "description": "Task description"},
-                                "sequence": {"type": "integer", "description": "Execution order"}
-                            },
-                            "required": ["role", "task", "sequence"]
-                        }
-                    }
-                },
-                "required": ["assignments"]
-            }
-        }
-    },
-    "write_file": {
-        "type": "function",
-        "function": {
-            "name": "write_file",
-            "description": "Write content to a file, creating or overwriting the file",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path relative to working directory"},
-                    "content": {"type": "string", "description": "Content to write to the file"}
-                },
-                "required": ["path", "content"]
-            }
-        }
-    },
-    "read_file": {
-        "type": "function",
-        "function": {
-            "name": "read_file",
-            "description": "Read the contents of a file. Large files are paginated; use the page parameter to read subsequent pages.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path relative to working directory"},
-                    "page": {"type": "integer", "description": "Page number to read (1-based, default 1). Each page contains 500 lines."}
-                },
-                "required": ["path"]
-            }
-        }
-    },
-    "edit_file": {
-        "type": "function",
-        "function": {
-            "name": "edit_file",
-            "description": "Edit a file with a diff operation",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path relative to working directory"},
-                    "diff": {"type": "string", "description": "Diff showing changes to make"}
-                },
-                "required": ["path", "diff"]
-            }
-        }
-    },
-    "list_directory": {
-        "type": "function",
-        "function": {
-            "name": "list_directory",
-            "description": "List contents of a directory as a recursive tree. Returns nested directories and files.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "Directory path relative to working directory"},
-                    "depth": {"type": "integer", "description": "Maximum recursion depth (-1 for unlimited, 0 for immediate only). Default: -1"}
-                },
-                "required": ["path"]
-            }
-        }
-    },
-    "list_all_files": {
-        "type": "function",
-        "function": {
-            "name": "list_all_files",
-            "description": "Recursively list all files in a directory",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "Directory path relative to working directory"},
-                    "extensions": {"type": "array", "description": "Optional list of file extensions to filter by", "items": {"type": "string"}}
-                },
-                "required": ["path"]
-            }
-        }
-    },
-    "search_files": {
-        "type": "function",
-        "function": {
-            "name": "search_files",
-            "description": "Search for files matching a pattern",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "pattern": {"type": "string", "description": "File pattern to search for (e.g., '*.py', 'test_*.py')"},
-                    "path": {"type": "string", "description": "Directory to search in, defaults to current directory"}
-                },
-                "required": ["pattern"]
-            }
-        }
-    },
-    "delete_file": {
-        "type": "function",
-        "function": {
-            "name": "delete_file",
-            "description": "Delete a file",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path to delete relative to working directory"}
-                },
-                "required": ["path"]
-            }
-        }
-    },
-    "get_file_info": {
-        "type": "function",
-        "function": {
-            "name": "get_file_info",
-            "description": "Get information about a file (size, modified time, etc.)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path relative to working directory"}
-                },
-                "required": ["path"]
-            }
-        }
-    },
-    "clone_repo": {
-        "type": "function",
-        "function": {
-            "name": "clone_repo",
-            "description": "Clone a git repository",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "repo_url": {"type": "string", "description": "Repository URL to clone"},
-                    "dest_dir": {"type": "string", "description": "Destination directory for the clone"},
-                    "branch": {"type": "string", "description": "Branch to check out"},
-                    "depth": {"type": "integer", "description": "Shallow clone depth"}
-                },
-                "required": ["repo_url"]
-            }
-        }
-    },
-    "checkout_branch": {
-        "type": "function",
-        "function": {
-            "name": "checkout_branch",
-            "description": "Checkout a git branch",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "repo_dir": {"type": "string", "description": "Repository directory"},
-                    "branch_name": {"type": "string", "description": "Branch name to checkout"},
-                    "create": {"type": "boolean", "description": "Whether to create the branch if it doesn't exist"}
-                },
-                "required": ["repo_dir", "branch_name"]
-            }
-        }
-    },
-    "run_python": {
-        "type": "function",
-        "function": {
-            "name": "run_python",
-            "description": "Execute Python code",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "code": {"type": "string", "description": "Python code to execute"},
-                    "timeout": {"type": "integer", "description": "Timeout in seconds (default 30)"},
-                    "log_path": {"type": "string", "description": "Optional path to log output"}
-                },
-                "required": ["code"]
-            }
-        }
-    },
-    "raise_callback": {
-        "type": "function",
-        "function": {
-            "name": "raise_callback",
-            "description": "Raise a callback for blocker issues, clarification requests, or queries",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "message": {"type": "string", "description": "The callback message"},
-                    "callback_type": {
-                        "type": "string",
-                        "enum": ["blocker", "clarification", "query"],
-                        "description": "Type of callback: blocker (blocking issue), clarification (need info), or query (general question)"
-                    }
-                },
-                "required": ["message", "callback_type"]
-            }
-        }
-    },
-    "audit_files": {
-        "type": "function",
-        "function": {
-            "name": "audit_files",
-            "description": "Audit files for quality, security, and correctness",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "file_paths": {"type": "array", "description": "List of file paths to audit", "items": {"type": "string"}},
-                    "description": {"type": "string", "description": "What to audit for (e.g., 'code quality', 'security issues')"},
-                    "focus_areas": {"type": "array", "description": "Specific areas to focus the audit on", "items": {"type": "string"}}
-                },
-                "required": ["file_paths", "description"]
-            }
-        }
-    },
-    "confirm_task_complete": {
-        "type": "function",
-        "function": {
-            "name": "confirm_task_complete",
-            "description": "Confirm that the assigned task is complete",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "summary": {"type": "string", "description": "Brief summary of what was completed"},
-                    "deliverables": {"type": "array", "description": "List of files or outputs created", "items": {"type": "string"}}
-                }
-            }
-        }
-    },
-    "search_package": {
-        "type": "function",
-        "function": {
-            "name": "search_package",
-            "description": "Search for and get information about a package",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string", "description": "Package name to search for"},
-                    "language": {"type": "string", "description": "Programming language (e.g., 'python', 'javascript')"}
-                },
-                "required": ["name"]
-            }
-        }
-    },
-    "install_package": {
-        "type": "function",
-        "function": {
-            "name": "install_package",
-            "description": "Install a package",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string", "description": "Package name to install"},
-                    "version": {"type": "string", "description": "Specific version to install"},
-                    "language": {"type": "string", "description": "Programming language (e.g., 'python')"}
-                },
-                "required": ["name"]
-            }
-        }
-    },
-    "check_package_installed": {
+# Shared parameter sub-schemas, referenced by several tools. Every
+# description is sent to the LLM on each request, so keep them short.
+# The same dict objects appear in many schemas; never mutate them.
+_PATH_PROP = {"type": "string", "description": "Path relative to working dir"}
+_DIR_PROP = {"type": "string", "description": "Directory relative to working dir"}
+_LANG_PROP = {"type": "string", "description": "Language: 'python' or 'javascript'"}
+_PKG_NAME_PROP = {"type": "string", "description": "Package name"}
+_SEQUENCE_PROP = {"type": "integer", "description": "Execution order; equal values run in parallel"}
+
+def _tool(name: str, description: str, properties: Dict[str, Any],
+          required: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Build one function-tool schema in the OpenAI format."""
+    parameters = {"type": "object", "properties": properties}
+    if required is not None:
+        parameters["required"] = required
+    return {
         "type": "function",
         "function": {
-            "name": "check_package_installed",
-            "description": "Check if a package is installed",
-            "parameters": {
+            "name": name,
+            "description": description,
+            "parameters": parameters,
+        },
+    }
+
+
+# Read-only at the top level so tools cannot be added or replaced at
+# runtime (get_tools_for_role caches lookups into it). The per-tool dicts
+# stay plain dicts because they are JSON-encoded into request payloads.
+TOOL_DEFINITIONS: Mapping[str, Dict[str, Any]] = MappingProxyType({
+    "assign_task": _tool("assign_task", "Assign one task to a role", {
+        "role": {"type": "string", "description": "Assignee role, e.g. 'developer', 'auditor'"},
+        "task": {"type": "string", "description": "Task details with context and dependencies"},
+        "sequence": _SEQUENCE_PROP,
+    }, ["role", "task", "sequence"]),
+    "assign_tasks": _tool("assign_tasks", "Assign several tasks at once", {
+        "assignments": {
+            "type": "array",
+            "description": "Task assignments",
+            "items": {
                 "type": "object",
                 "properties": {
-                    "name": {"type": "string", "description": "Package name to check"},
-                    "language": {"type": "string", "description": "Programming language"}
+                    "role": {"type": "string", "description": "Assignee role"},
+                    "task": {"type": "string", "description": "Task description"},
+                    "sequence": _SEQUENCE_PROP,
                 },
-                "required": ["name"]
-            }
-        }
-    },
-    "list_installed_packages": {
-        "type": "function",
-        "function": {
-            "name": "list_installed_packages",
-            "description": "List all installed packages",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "language": {"type": "string", "description": "Programming language (e.g., 'python')"}
-                }
-            }
-        }
-    },
-}
-
-
-def get_tools_for_role(allowed_tools: list) -> list:
+                "required": ["role", "task", "sequence"],
+            },
+        },
+    }, ["assignments"]),
+    "write_file": _tool("write_file", "Create or overwrite a file", {
+        "path": _PATH_PROP,
+        "content": {"type": "string", "description": "Content to write"},
+    }, ["path", "content"]),
+    "read_file": _tool("read_file", "Read a file; large files are paginated by page", {
+        "path": _PATH_PROP,
+        "page": {"type": "integer", "description": "1-based page (default 1); 500 lines per page"},
+    }, ["path"]),
+    "edit_file": _tool("edit_file", "Apply a unified diff to a file", {
+        "path": _PATH_PROP,
+        "diff": {"type": "string", "description": "Unified diff to apply"},
+    }, ["path", "diff"]),
+    "list_directory": _tool("list_directory", "List a directory as a recursive tree", {
+        "path": _DIR_PROP,
+        "depth": {"type": "integer", "description": "Max depth: -1 unlimited (default), 0 top only"},
+    }, ["path"]),
+    "list_all_files": _tool("list_all_files", "Recursively list files in a directory", {
+        "path": _DIR_PROP,
+        "extensions": {"type": "array", "description": "File extensions to filter by", "items": {"type": "string"}},
+    }, ["path"]),
+    "search_files": _tool("search_files", "Find files by glob pattern", {
+        "pattern": {"type": "string", "description": "Glob pattern, e.g. '*.py'"},
+        "path": {"type": "string", "description": "Directory to search (default '.')"},
+    }, ["pattern"]),
+    "delete_file": _tool("delete_file", "Delete a file", {
+        "path": _PATH_PROP,
+    }, ["path"]),
+    "get_file_info": _tool("get_file_info", "Get file metadata (size, mtime, etc.)", {
+        "path": _PATH_PROP,
+    }, ["path"]),
+    "clone_repo": _tool("clone_repo", "Clone a git repository", {
+        "repo_url": {"type": "string", "description": "Repository URL"},
+        "dest_dir": {"type": "string", "description": "Clone destination directory"},
+        "branch": {"type": "string", "description": "Branch to check out"},
+        "depth": {"type": "integer", "description": "Shallow clone depth"},
+    }, ["repo_url"]),
+    "checkout_branch": _tool("checkout_branch", "Checkout a git branch", {
+        "repo_dir": {"type": "string", "description": "Repository directory"},
+        "branch_name": {"type": "string", "description": "Branch name"},
+        "create": {"type": "boolean", "description": "Create the branch if missing"},
+    }, ["repo_dir", "branch_name"]),
+    "run_python": _tool("run_python", "Execute Python code", {
+        "code": {"type": "string", "description": "Python code to execute"},
+        "timeout": {"type": "integer", "description": "Timeout in seconds (default 30)"},
+        "log_path": {"type": "string", "description": "Path to log output to"},
+    }, ["code"]),
+    "raise_callback": _tool("raise_callback", "Raise a blocker, clarification request, or query", {
+        "message": {"type": "string", "description": "Callback message"},
+        "callback_type": {
+            "type": "string",
+            "enum": ["blocker", "clarification", "query"],
+            "description": "blocker, clarification, or general query",
+        },
+    }, ["message", "callback_type"]),
+    "audit_files": _tool("audit_files", "Audit files for quality, security, correctness", {
+        "file_paths": {"type": "array", "description": "File paths to audit", "items": {"type": "string"}},
+        "description": {"type": "string", "description": "What to audit for, e.g. 'security issues'"},
+        "focus_areas": {"type": "array", "description": "Areas to focus on", "items": {"type": "string"}},
+    }, ["file_paths", "description"]),
+    "confirm_task_complete": _tool("confirm_task_complete", "Confirm the assigned task is complete", {
+        "summary": {"type": "string", "description": "Brief summary of work done"},
+        "deliverables": {"type": "array", "description": "Files or outputs created", "items": {"type": "string"}},
+    }),
+    "search_package": _tool("search_package", "Look up package info", {
+        "name": _PKG_NAME_PROP,
+        "language": _LANG_PROP,
+    }, ["name"]),
+    "install_package": _tool("install_package", "Install a package", {
+        "name": _PKG_NAME_PROP,
+        "version": {"type": "string", "description": "Version to install"},
+        "language": _LANG_PROP,
+    }, ["name"]),
+    "check_package_installed": _tool("check_package_installed", "Check if a package is installed", {
+        "name": _PKG_NAME_PROP,
+        "language": _LANG_PROP,
+    }, ["name"]),
+    "list_installed_packages": _tool("list_installed_packages", "List installed packages", {
+        "language": _LANG_PROP,
+    }),
+})
+
+
+@functools.lru_cache(maxsize=128)
+def _tools_for_names(allowed_tools: Tuple[str, ...]) -> Tuple[Dict[str, Any], ...]:
+    """Cached lookup behind ``get_tools_for_role`` (keyed on the name tuple)."""
+    # Definitions are non-empty dicts, so filter(None) drops only misses.
+    return tuple(filter(None, map(TOOL_DEFINITIONS.get, allowed_tools)))
+
+
+def get_tools_for_role(allowed_tools: List[str]) -> Tuple[Dict[str, Any], ...]:
     """
     Get tool definitions for a specific role.
 
+    Results are cached per distinct tool list, so repeated calls for the
+    same role return the same tuple. The tuple and the definitions in it
+    are shared and must not be mutated by callers.
+
     Args:
         allowed_tools: List of tool names allowed for this role
 
     Returns:
-        List of tool definitions in OpenAI JSON schema format
+        Tuple of tool definitions in OpenAI JSON schema format
     """
-    return [TOOL_DEFINITIONS[name] for name in allowed_tools if name in TOOL_DEFINITIONS]
+    return _tools_for_names(tuple(allowed_tools))
 
 
 # ---------------------------------------------------------------------------
 # Tool descriptions for prompt injection
 # ---------------------------------------------------------------------------
 
-def get_tools_description(allowed_tools: Optional[List[str]] = None) -> str:
-    """
-    Get a formatted description of all available tools for injection into agent prompts.
-
-    Returns:
-        Multi-line string describing all tools and their signatures
-    """
-    description = """
+_TOOLS_DESCRIPTION = """
 Available tools (call these methods in your implementation):
 
 File Reading:
@@ -1738,21 +2026,7 @@ Exception types: PathError (invalid path), FileSizeError (>10MB), PackageError (
 See docs/agents/AGENT_TOOLS_GUIDE.md for detailed examples and patterns.
 """.strip()
 
-    if allowed_tools is not None:
-        allowed_line = "Allowed tools for your role: " + ", ".join(allowed_tools)
-        return f"{description}\n\n{allowed_line}".strip()
-
-    return description
-
-
-def get_manager_tools_description(allowed_tools: Optional[List[str]] = None) -> str:
-    """
-    Get a formatted description of task assignment tools for the manager role.
-
-    Returns:
-        Multi-line string describing assignment tools and their usage
-    """
-    description = """
+_MANAGER_TOOLS_DESCRIPTION = """
 Available task assignment tools:
 
 Task Assignment:
@@ -1787,13 +2061,70 @@ IMPORTANT:
 - Call assign_task/assign_tasks multiple times to build your task plan
 """.strip()
 
+
+@functools.lru_cache(maxsize=32)
+def _describe_tools(description: str, allowed_tools: Optional[Tuple[str, ...]]) -> str:
+    """Append the role's allowed-tools line to *description* (cached per tool tuple)."""
+    if allowed_tools is None:
+        return description
+    allowed_line = "Allowed tools for your role: " + ", ".join(allowed_tools)
+    return f"{description}\n\n{allowed_line}".strip()
+
+
+def get_tools_description(allowed_tools: Optional[List[str]] = None) -> str:
+    """
+    Get a formatted description of all available tools for injection into agent prompts.
+
+    Returns:
+        Multi-line string describing all tools and their signatures
+    """
     if allowed_tools is not None:
-        allowed_line = "Allowed tools for your role: " + ", ".join(allowed_tools)
-        return f"{description}\n\n{allowed_line}".strip()
+        allowed_tools = tuple(allowed_tools)
+    return _describe_tools(_TOOLS_DESCRIPTION, allowed_tools)
+
+
+def get_manager_tools_description(allowed_tools: Optional[List[str]] = None) -> str:
+    """
+    Get a formatted description of task assignment tools for the manager role.
+
+    Returns:
+        Multi-line string describing assignment tools and their usage
+    """
+    if allowed_tools is not None:
+        allowed_tools = tuple(allowed_tools)
+    return _describe_tools(_MANAGER_TOOLS_DESCRIPTION, allowed_tools)
+
 
-    return description
 # ---------------------------------------------------------------------------
 
+# Core file tools every environment binds: (name, supports_page, is_write).
+# Writes are tracked as produced files for developers.
+_CORE_TOOL_PLAN = (
+    ("read_file",      False, False),
+    ("write_file",     False, True),
+    ("edit_file",      False, True),
+    ("list_directory", True,  False),
+    ("list_all_files", True,  False),
+    ("search_files",   True,  False),
+    ("get_file_info",  True,  False),
+    ("delete_file",    False, False),
+)
+
+# Tools that can create, change or remove files; calling one drops the
+# environment's cached audit path checks.
+_MUTATING_TOOLS = frozenset({
+    "write_file", "edit_file", "delete_file",
+    "run_python", "clone_repo", "checkout_branch",
+})
+
+# Read-only core tools (name -> supports_page) that consecutive structured
+# or inline calls may run concurrently.
+_CONCURRENT_TOOLS: Mapping[str, bool] = MappingProxyType({
+    name: supports_page for name, supports_page, _ in _CORE_TOOL_PLAN
+    if name not in _MUTATING_TOOLS
+})
+
+
 class ToolEnvironment:
     """
     Builds and manages the tool execution environment for an agent.
@@ -1807,6 +2138,14 @@ class ToolEnvironment:
     This replaces the three copies of ``exec_globals`` that previously existed.
     """
 
+    # One environment is built per agent turn and every tool call updates
+    # its counters, so skip the per-instance __dict__.
+    __slots__ = (
+        "tools", "tool_outputs", "files_produced", "audit_requests",
+        "task_complete", "total_calls",
+        "_agent", "_allowed", "_audit_path_problems", "_bindings",
+    )
+
     def __init__(self, agent, working_dir: str = "."):
         allowed_tools = agent.config.get("allowed_tools")
         default_git_branch = agent.config.get("default_git_branch")
@@ -1819,8 +2158,13 @@ class ToolEnvironment:
         self.total_calls: int = 0
 
         self._agent = agent
+        # None means "all tools"; otherwise a frozenset for O(1) checks
+        self._allowed: Optional[frozenset] = (
+            None if allowed_tools is None else frozenset(allowed_tools))
+        # path -> reason it can't be audited (None if auditable)
+        self._audit_path_problems: Dict[str, Optional[str]] = {}
         self._bindings: Dict[str, Any] = {}
-        self._build_bindings(agent, allowed_tools, default_git_branch, working_dir)
+        self._build_bindings(agent, default_git_branch, working_dir)
 
     # -- public API ----------------------------------------------------------
 
@@ -1828,41 +2172,106 @@ class ToolEnvironment:
         """Return the tool-name -> callable mapping (same dict every time)."""
         return self._bindings
 
+    def run_concurrently(
+        self, calls: List[Tuple[str, Tuple[Any, ...], Dict[str, Any]]],
+    ) -> List[Optional[Exception]]:
+        """
+        Run read-only file tool calls on a thread pool.
+
+        Only the AgentTools methods run on worker threads. Each successful
+        call is then counted and its output captured on this thread, in
+        call order, exactly as its binding would have done.
+
+        Args:
+            calls: (tool name, args, kwargs) for tools in _CONCURRENT_TOOLS
+
+        Returns:
+            The exception each call raised, or None, in call order
+        """
+        prepared = []
+        for name, args, kwargs in calls:
+            kwargs = dict(kwargs)
+            page = kwargs.pop("page", None) if _CONCURRENT_TOOLS[name] else None
+            prepared.append((name, args, kwargs, page))
+
+        def run(call):
+            name, args, kwargs, _ = call
+            try:
+                return getattr(self.tools, name)(*args, **kwargs), None
+            except Exception as e:
+                return None, e
+
+        with ThreadPoolExecutor(max_workers=min(TOOL_CALL_MAX_WORKERS, len(prepared))) as pool:
+            outcomes = list(pool.map(run, prepared))
+
+        errors = []
+        for (name, args, kwargs, page), (result, error) in zip(prepared, outcomes):
+            if error is None:
+                self._record_call(name, args, kwargs, result, page)
+            errors.append(error)
+        return errors
+
     # -- private construction ------------------------------------------------
 
-    def _is_allowed(self, tool_name: str, allowed_tools) -> bool:
-        return allowed_tools is None or tool_name in (allowed_tools or [])
+    def _audit_path_problem(self, file_path: str) -> Optional[str]:
+        """
+        Check that *file_path* is an existing file inside the working dir.
+
+        Results are reused across audit calls until a mutating tool runs.
 
-    def _build_bindings(self, agent, allowed_tools, default_git_branch, working_dir):
+        Returns:
+            None if the file can be audited, else a warning message
+        """
+        cacheable = isinstance(file_path, str)
+        if cacheable and file_path in self._audit_path_problems:
+            return self._audit_path_problems[file_path]
+        problem = self._find_audit_path_problem(file_path)
+        if cacheable:
+            self._audit_path_problems[file_path] = problem
+        return problem
+
+    def _find_audit_path_problem(self, file_path: str) -> Optional[str]:
+        """Uncached check behind _audit_path_problem; safe to run on any thread."""
+        try:
+            abs_path = self.tools._validate_path(file_path)
+            if os.path.isfile(abs_path):
+                return None
+            return f"File not found for audit: {file_path}"
+        except Exception as e:
+            return f"Invalid path for audit: {file_path} - {e}"
+
+    def _check_audit_paths(self, file_paths) -> None:
+        """Check not-yet-cached audit paths in parallel when there are enough."""
+        pending = list({fp for fp in file_paths if isinstance(fp, str)}
+                       - self._audit_path_problems.keys())
+        if len(pending) < AUDIT_PARALLEL_MIN_FILES:
+            return  # not worth the threads; checked inline as needed
+        with ThreadPoolExecutor(max_workers=min(AUDIT_MAX_WORKERS, len(pending))) as pool:
+            # Workers only check; the cache is filled here, on this thread
+            problems = pool.map(self._find_audit_path_problem, pending)
+            for file_path, problem in zip(pending, problems):
+                self._audit_path_problems[file_path] = problem
+
+    def _is_allowed(self, tool_name: str) -> bool:
+        return self._allowed is None or tool_name in self._allowed
+
+    def _build_bindings(self, agent, default_git_branch, working_dir):
         """Build the complete name -> callable mapping."""
         b = self._bindings
         tools = self.tools
         is_developer = agent.role == "developer"
 
         # ---- Core file tools (always wrapped for output capture) -----------
-        CORE_TOOLS = {
-            "read_file":      (tools.read_file,      False),
-            "write_file":     (tools.write_file,     False),
-            "edit_file":      (tools.edit_file,      False),
-            "list_directory": (tools.list_directory, True),
-            "list_all_files": (tools.list_all_files, True),
-            "search_files":   (tools.search_files,   True),
-            "get_file_info":  (tools.get_file_info,  True),
-            "delete_file":    (tools.delete_file,    False),
-        }
-
-        WRITE_TOOLS = {"write_file", "edit_file"}
-
-        for name, (func, supports_page) in CORE_TOOLS.items():
-            track_file = is_developer and name in WRITE_TOOLS
-            b[name] = self._wrap(name, func, supports_page=supports_page,
-                                 track_file=track_file)
+        for name, supports_page, is_write in _CORE_TOOL_PLAN:
+            b[name] = self._wrap(name, getattr(tools, name),
+                                 supports_page=supports_page,
+                                 track_file=is_developer and is_write)
 
         # ---- Suppress print ------------------------------------------------
         b["print"] = lambda *a, **kw: None
 
         # ---- clone_repo (with default branch injection) --------------------
-        if self._is_allowed("clone_repo", allowed_tools):
+        if self._is_allowed("clone_repo"):
             def _clone(repo_url, dest_dir=None, branch=None, depth=None):
                 effective_branch = branch or default_git_branch
                 return tools.clone_repo(repo_url, dest_dir=dest_dir,
@@ -1872,22 +2281,21 @@ class ToolEnvironment:
             b["clone_repo"] = self._blocked("clone_repo")
 
         # ---- run_python ----------------------------------------------------
-        if self._is_allowed("run_python", allowed_tools):
+        if self._is_allowed("run_python"):
             b["run_python"] = self._wrap(
                 "run_python", tools.run_python, supports_page=True)
         else:
             b["run_python"] = self._blocked("run_python")
 
         # ---- checkout_branch -----------------------------------------------
-        if self._is_allowed("checkout_branch", allowed_tools):
+        if self._is_allowed("checkout_branch"):
             b["checkout_branch"] = self._wrap("checkout_branch",
                                               tools.checkout_branch)
         else:
             b["checkout_branch"] = self._blocked("checkout_branch")
 
         # ---- raise_callback ------------------------------------------------
-        if self._is_allowed("raise_callback", allowed_tools):
-            from main.agent.callbacks import raise_callback
+        if self._is_allowed("raise_callback"):
             b["raise_callback"] = self._wrap(
                 "raise_callback",
                 lambda message, callback_type="query": raise_callback(
@@ -1909,24 +2317,23 @@ class ToolEnvironment:
                         "Only audit files you created/modified with write_file or edit_file."
                     )
                 # Validate files exist
-                validated = []
+                self._check_audit_paths(file_paths)
+                validated, invalid = [], []
                 for fp in file_paths:
-                    try:
-                        abs_path = tools._validate_path(fp)
-                        if os.path.isfile(abs_path):
-                            validated.append(fp)
-                        else:
-                            logger.warning(f"File not found for audit: {fp}")
-                    except Exception as e:
-                        logger.warning(f"Invalid path for audit: {fp} - {e}")
+                    problem = self._audit_path_problem(fp)
+                    if problem is None:
+                        validated.append(fp)
+                    else:
+                        logger.warning(problem)
+                        invalid.append(fp)
                 result = {
                     "status": "audit_requested",
                     "audit_type": "file_review",
                     "files": validated,
-                    "invalid_files": [f for f in file_paths if f not in validated],
+                    "invalid_files": invalid,
                     "description": description,
                     "focus_areas": focus_areas,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": _utc_now_iso(),
                 }
                 self.audit_requests.append({
                     "files": file_paths,
@@ -1940,22 +2347,21 @@ class ToolEnvironment:
             def _audit_basic(file_paths, description="", focus_areas=None):
                 if focus_areas is None:
                     focus_areas = []
-                validated = []
+                self._check_audit_paths(file_paths)
+                validated, invalid = [], []
                 for fp in file_paths:
-                    try:
-                        abs_path = tools._validate_path(fp)
-                        if os.path.isfile(abs_path):
-                            validated.append(fp)
-                    except Exception:
-                        pass
+                    if self._audit_path_problem(fp) is None:
+                        validated.append(fp)
+                    else:
+                        invalid.append(fp)
                 return {
                     "status": "audit_requested",
                     "audit_type": "file_review",
                     "files": validated,
-                    "invalid_files": [f for f in file_paths if f not in validated],
+                    "invalid_files": invalid,
                     "description": description,
                     "focus_areas": focus_areas,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": _utc_now_iso(),
                 }
             b["audit_files"] = self._wrap("audit_files", _audit_basic,
                                           supports_page=True)
@@ -1970,7 +2376,7 @@ class ToolEnvironment:
                 "task_complete": True,
                 "summary": summary,
                 "deliverables": deliverables,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "timestamp": _utc_now_iso(),
             }
 
         b["confirm_task_complete"] = self._wrap(
@@ -1982,29 +2388,35 @@ class ToolEnvironment:
               track_file: bool = False):
         """Return a wrapper that captures output and optionally tracks files."""
         env = self  # closure ref
+        mutates = name in _MUTATING_TOOLS
 
         def wrapper(*args, **kwargs):
-            page = None
-            if supports_page and isinstance(kwargs, dict):
-                page = kwargs.pop("page", None)
+            page = kwargs.pop("page", None) if supports_page else None
+            if mutates:
+                env._audit_path_problems.clear()
             result = func(*args, **kwargs)
-            env.total_calls += 1
-
-            # Track file produced (path can be positional or keyword)
-            if track_file:
-                path = kwargs.get("path") if kwargs and "path" in kwargs else (args[0] if args else None)
-                if path:
-                    env.files_produced.add(path)
-
-            # Capture output
-            page_index = page if isinstance(page, int) and page > 0 else 1
-            entry = _format_tool_output(name, args, kwargs, result, page_index)
-            if entry:
-                env.tool_outputs.append(entry)
+            env._record_call(name, args, kwargs, result, page, track_file)
             return result
 
         return wrapper
 
+    def _record_call(self, name: str, args, kwargs: Dict[str, Any], result: Any,
+                     page: Any, track_file: bool = False) -> None:
+        """Count a completed tool call, track its file and capture its output."""
+        self.total_calls += 1
+
+        # Track file produced (path can be positional or keyword)
+        if track_file:
+            path = kwargs.get("path") if kwargs and "path" in kwargs else (args[0] if args else None)
+            if path:
+                self.files_produced.add(path)
+
+        # Capture output
+        page_index = page if type(page) is int and page > 0 else 1
+        entry = _format_tool_output(name, args, kwargs, result, page_index)
+        if entry:
+            self.tool_outputs.append(entry)
+
     @staticmethod
     def _blocked(tool_name: str):
         """Return a callable that raises ToolError for disallowed tools."""
@@ -2017,6 +2429,37 @@ class ToolEnvironment:
 # Public entry point
 # ---------------------------------------------------------------------------
 
+def _lru_cache_short(maxsize: int):
+    """
+    ``functools.lru_cache`` for a one-string function, skipped for long input.
+
+    Agents repeat short snippets, but long source usually embeds whole file
+    bodies that rarely recur, and caching it would pin that text (and what
+    was built from it) for the life of the process. Strings longer than
+    PARSE_CACHE_MAX_CHARS bypass the cache.
+    """
+    def decorator(func):
+        cached = functools.lru_cache(maxsize=maxsize)(func)
+
+        @functools.wraps(func)
+        def wrapper(text: str):
+            if len(text) > PARSE_CACHE_MAX_CHARS:
+                return func(text)
+            return cached(text)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+
+@_lru_cache_short(maxsize=256)
+def _compile_code_block(code_block: str):
+    """Compile an agent code block once; agents repeat identical snippets."""
+    # "<string>" keeps SyntaxError messages identical to a plain exec(str)
+    return compile(code_block, "<string>", "exec")
+
+
 def execute_tools_from_response(
     agent,
     response: str,
@@ -2033,8 +2476,8 @@ def execute_tools_from_response(
 
     Returns a dict compatible with all existing callers.
     """
-    # Parse inputs
-    code_blocks = re.findall(r'```python\n(.*?)\n```', response, re.DOTALL)
+    # Parse inputs; substring checks skip scans that cannot match
+    code_blocks = _CODE_BLOCK_RE.findall(response) if "```python" in response else []
     structured_tool_calls: list = []
     if isinstance(message, dict):
         structured_tool_calls = message.get("tool_calls", []) or []
@@ -2042,7 +2485,8 @@ def execute_tools_from_response(
     allowed_tools = agent.config.get("allowed_tools")
     inline_calls: List[Tuple[str, list, dict]] = []
     if not code_blocks and not structured_tool_calls:
-        inline_calls = _extract_inline_calls(response, allowed_tools)
+        if "(" in response:
+            inline_calls = _extract_inline_calls(response, allowed_tools)
         if not inline_calls:
             logger.debug(f"No tool calls found in response from {agent.name}")
             return {
@@ -2058,7 +2502,7 @@ def execute_tools_from_response(
     # --- Execute code blocks ------------------------------------------------
     for code_block in code_blocks:
         try:
-            exec(code_block, bindings, {})
+            exec(_compile_code_block(code_block), bindings, {})
             results.append({"success": True, "code_executed": len(code_block)})
             logger.info(f"Agent {agent.name} executed tools successfully")
         except Exception as e:
@@ -2068,8 +2512,12 @@ def execute_tools_from_response(
                 "error": str(e),
                 "code": code_block[:200],
             })
+        finally:
+            # A block may have changed files through os directly
+            env._audit_path_problems.clear()
 
     # --- Execute structured tool_calls --------------------------------------
+    calls: List[Tuple[Any, tuple, Any]] = []
     for tc in structured_tool_calls:
         if tc.get("type") != "function":
             continue
@@ -2080,38 +2528,12 @@ def execute_tools_from_response(
             args = json.loads(args_str) if isinstance(args_str, str) else args_str
         except json.JSONDecodeError:
             args = {}
-
-        if not func_name or func_name not in bindings:
-            results.append({"success": False, "tool": func_name,
-                            "error": f"Unknown tool: {func_name}"})
-            continue
-
-        try:
-            bindings[func_name](**(args or {}))
-            results.append({"success": True, "tool": func_name})
-            logger.info(f"Agent {agent.name} executed tool call: {func_name}")
-        except Exception as e:
-            logger.error(f"Tool execution failed for {agent.name}: {e}")
-            results.append({"success": False, "tool": func_name,
-                            "error": str(e)})
+        calls.append((func_name, (), args or {}))
+    _run_tool_calls(env, calls, agent, results)
 
     # --- Execute inline calls (fallback) ------------------------------------
     if not code_blocks and not structured_tool_calls:
-        for func_name, i_args, i_kwargs in inline_calls:
-            if func_name not in bindings:
-                results.append({"success": False, "tool": func_name,
-                                "error": f"Unknown tool: {func_name}"})
-                continue
-            try:
-                bindings[func_name](*i_args, **i_kwargs)
-                results.append({"success": True, "tool": func_name})
-                logger.info(
-                    f"Agent {agent.name} executed inline tool call: {func_name}")
-            except Exception as e:
-                logger.error(
-                    f"Inline tool execution failed for {agent.name}: {e}")
-                results.append({"success": False, "tool": func_name,
-                                "error": str(e)})
+        _run_tool_calls(env, inline_calls, agent, results, inline=True)
 
     # --- Build result dict --------------------------------------------------
     result_dict: Dict[str, Any] = {
@@ -2138,6 +2560,60 @@ def execute_tools_from_response(
 # Helpers (unchanged public interface for imports)
 # ---------------------------------------------------------------------------
 
+def _run_tool_calls(
+    env: ToolEnvironment,
+    calls: List[Tuple[Any, Any, Any]],
+    agent,
+    results: List[Dict[str, Any]],
+    inline: bool = False,
+) -> None:
+    """
+    Execute (name, args, kwargs) tool calls in order, appending to *results*.
+
+    Runs of two or more consecutive read-only file tool calls go through
+    ``env.run_concurrently``; everything else is called one at a time
+    through the environment's bindings.
+    """
+    bindings = env.get_bindings()
+    kind = "inline tool call" if inline else "tool call"
+    failure = "Inline tool execution failed" if inline else "Tool execution failed"
+
+    def record(func_name, error):
+        if error is None:
+            results.append({"success": True, "tool": func_name})
+            logger.info(f"Agent {agent.name} executed {kind}: {func_name}")
+        else:
+            logger.error(f"{failure} for {agent.name}: {error}")
+            results.append({"success": False, "tool": func_name,
+                            "error": str(error)})
+
+    i = 0
+    while i < len(calls):
+        end = i
+        while (end < len(calls) and calls[end][0] in _CONCURRENT_TOOLS
+               and calls[end][0] in bindings and type(calls[end][2]) is dict):
+            end += 1
+        if end - i > 1:
+            batch = [(name, tuple(args), kwargs) for name, args, kwargs in calls[i:end]]
+            for (func_name, _, _), error in zip(batch, env.run_concurrently(batch)):
+                record(func_name, error)
+            i = end
+            continue
+
+        func_name, args, kwargs = calls[i]
+        i += 1
+        if func_name not in bindings:
+            results.append({"success": False, "tool": func_name,
+                            "error": f"Unknown tool: {func_name}"})
+            continue
+        try:
+            bindings[func_name](*args, **kwargs)
+        except Exception as e:
+            record(func_name, e)
+        else:
+            record(func_name, None)
+
+
 def _capture_output_wrapper(
     tool_outputs: List[Dict[str, Any]],
     tool_name: str,
@@ -2146,11 +2622,9 @@ def _capture_output_wrapper(
 ):
     """Legacy wrapper – kept for any external callers."""
     def wrapper(*args, **kwargs):
-        page = None
-        if supports_page and isinstance(kwargs, dict):
-            page = kwargs.pop("page", None)
+        page = kwargs.pop("page", None) if supports_page else None
         result = func(*args, **kwargs)
-        page_index = page if isinstance(page, int) and page > 0 else 1
+        page_index = page if type(page) is int and page > 0 else 1
         output_entry = _format_tool_output(tool_name, args, kwargs, result,
                                            page_index)
         if output_entry:
@@ -2166,10 +2640,10 @@ def _format_tool_output(
     result: Any,
     page_index: int,
 ) -> Optional[Dict[str, Any]]:
-    text = _stringify_tool_output(result)
-    if text is None:
+    paged = _page_tool_output(result, page_index, DEFAULT_PAGE_LINES)
+    if paged is None:
         return None
-    page_text, total_pages = _paginate_text(text, page_index, DEFAULT_PAGE_LINES)
+    page_text, total_pages = paged
     return {
         "tool": tool_name,
         "args": list(args),
@@ -2181,58 +2655,308 @@ def _format_tool_output(
     }
 
 
+def _page_tool_output(result: Any, page: int, lines_per_page: int) -> Optional[Tuple[str, int]]:
+    """
+    Render one page of a tool result as text.
+
+    Equivalent to paginating ``_stringify_tool_output(result)``, but nested
+    dicts and lists are streamed through the JSON encoder so only the
+    requested page is ever held in memory.
+
+    Returns:
+        (page text, total pages), or None if the result has no output
+    """
+    if isinstance(result, (dict, list, tuple)):
+        text = _dumps_flat_dict(result) if type(result) is dict else None
+        if text is None:
+            try:
+                return _paginate_json(result, page, lines_per_page)
+            except (TypeError, ValueError):
+                text = str(result)
+    else:
+        text = _stringify_tool_output(result)
+        if text is None:
+            return None
+    if "\n" in text or _has_other_line_breaks(text):
+        return _paginate_text(text, page, lines_per_page)
+    return text, 1  # a single line is always one page
+
+
+def _paginate_json(result: Any, page: int, lines_per_page: int) -> Tuple[str, int]:
+    """
+    Paginate ``json.dumps(result, indent=2)`` without building the full text.
+
+    Encoder chunks are kept only while they belong to the requested page;
+    the rest are just counted for the page total. With ensure_ascii the
+    output's only line breaks are indentation newlines.
+
+    Raises:
+        TypeError, ValueError: If *result* is not JSON serializable
+    """
+    page = max(1, page)
+    parts: List[str] = []
+    page_number = 1
+    page_lines = 0  # newlines already inside the page being collected
+    collecting = True
+    newlines = 0
+    for chunk in _INDENT_JSON_ENCODER.iterencode(result):
+        count = chunk.count("\n")
+        newlines += count
+        if not collecting:
+            continue
+        if page_lines + count < lines_per_page:
+            parts.append(chunk)
+            page_lines += count
+            continue
+        # The chunk closes at least one page: split it at each boundary
+        start = 0
+        while True:
+            end = start - 1
+            for _ in range(lines_per_page - page_lines):
+                end = chunk.find("\n", end + 1)
+                if end < 0:
+                    break
+            if end < 0:
+                parts.append(chunk[start:])
+                page_lines += chunk.count("\n", start)
+                break
+            parts.append(chunk[start:end])
+            if page_number == page:
+                collecting = False
+                break
+            # Past pages are dropped; a page beyond the end keeps the last
+            page_number += 1
+            parts = []
+            page_lines = 0
+            start = end + 1
+    total_pages = max(1, (newlines + lines_per_page) // lines_per_page)
+    return "".join(parts), total_pages
+
+
+# Encoded forms of the non-string scalars a flat tool result may hold
+_JSON_CONSTANTS = {None: "null", True: "true", False: "false"}
+# Same settings _stringify_tool_output passes to json.dumps
+_INDENT_JSON_ENCODER = json.JSONEncoder(indent=2, ensure_ascii=True)
+
+
+def _dumps_flat_dict(result: Dict[Any, Any]) -> Optional[str]:
+    """
+    Encode a dict of scalar values exactly as ``json.dumps(indent=2)`` would.
+
+    Most tool results are flat status dicts; with ``indent`` set, json falls
+    back to its pure-Python encoder, so those are assembled directly here.
+
+    Returns:
+        The encoded text, or None if *result* holds anything other than str
+        keys and str/int/bool/None or empty list/dict values
+    """
+    if not result:
+        return "{}"
+    items = []
+    for key, value in result.items():
+        if type(key) is not str:
+            return None
+        kind = type(value)
+        if kind is str:
+            text = json_escape(value)
+        elif kind is int:
+            text = int.__repr__(value)
+        elif value is None or kind is bool:
+            text = _JSON_CONSTANTS[value]
+        elif (kind is list or kind is dict) and not value:
+            text = "[]" if kind is list else "{}"
+        else:
+            return None
+        items.append(f"{json_escape(key)}: {text}")
+    return "{\n  " + ",\n  ".join(items) + "\n}"
+
+
 def _stringify_tool_output(result: Any) -> Optional[str]:
     if result is None:
         return None
     if isinstance(result, str):
         return result
+    if type(result) is dict:
+        text = _dumps_flat_dict(result)
+        if text is not None:
+            return text
     try:
         return json.dumps(result, indent=2, ensure_ascii=True)
     except (TypeError, ValueError):
         return str(result)
 
 
+@functools.lru_cache(maxsize=8)
+def _line_run_pattern(lines: int) -> "re.Pattern[str]":
+    """Regex consuming up to *lines* newline-terminated lines."""
+    return re.compile(rf"(?:[^\n]*\n){{0,{lines}}}")
+
+
+def _has_other_line_breaks(text: str) -> bool:
+    """True if *text* holds a str.splitlines() boundary other than "\\n"."""
+    breaks = _ASCII_LINE_BREAKS if text.isascii() else _OTHER_LINE_BREAKS
+    return any(char in text for char in breaks)
+
+
 def _paginate_text(text: str, page: int, lines_per_page: int) -> Tuple[str, int]:
-    lines = text.splitlines()
-    if not lines:
+    if _has_other_line_breaks(text):
+        # Rare: normalise every str.splitlines() boundary to "\n"
+        lines = text.splitlines()
+        if not lines:
+            return "", 1
+        total_pages = max(1, (len(lines) + lines_per_page - 1) // lines_per_page)
+        safe_page = max(1, min(page, total_pages))
+        start = (safe_page - 1) * lines_per_page
+        end = start + lines_per_page
+        return "\n".join(lines[start:end]), total_pages
+
+    # "\n"-only text: count lines and slice the page out without a line list
+    total_lines = text.count("\n")
+    if text and not text.endswith("\n"):
+        total_lines += 1
+    if not total_lines:
         return "", 1
-    total_pages = max(1, (len(lines) + lines_per_page - 1) // lines_per_page)
+    total_pages = max(1, (total_lines + lines_per_page - 1) // lines_per_page)
     safe_page = max(1, min(page, total_pages))
-    start = (safe_page - 1) * lines_per_page
-    end = start + lines_per_page
-    return "\n".join(lines[start:end]), total_pages
+    skip_page = _line_run_pattern(lines_per_page).match
+    start = 0
+    for _ in range(safe_page - 1):
+        start = skip_page(text, start).end()
+    end = skip_page(text, start).end()
+    if end < len(text) and text.count("\n", start, end) < lines_per_page:
+        return text[start:], total_pages  # last page ends without "\n"
+    return text[start:end - 1], total_pages
+
+
+def _literal_value(node: ast.AST) -> Any:
+    """``ast.literal_eval`` with a shortcut for plain constants (most arguments)."""
+    if type(node) is ast.Constant:
+        return node.value
+    return ast.literal_eval(node)
+
+
+@functools.lru_cache(maxsize=32)
+def _inline_call_pattern(allowed_names: frozenset) -> "re.Pattern[str]":
+    """Regex matching a line that starts with a call to one of *allowed_names*."""
+    names = "|".join(map(re.escape, sorted(allowed_names)))
+    return re.compile(rf"\s*(?:{names})\(")
+
+
+@_lru_cache_short(maxsize=2048)
+def _parse_inline_call(line: str) -> Optional[ast.Call]:
+    """
+    Parse a stripped line as a plain ``name(...)`` call expression.
+
+    Agents often repeat the same call line across responses. The parsed
+    node is cached and its arguments are evaluated fresh on every use, so
+    list and dict arguments are never shared between calls.
+
+    Returns:
+        The Call node, or None if the line is not such a call
+    """
+    try:
+        call = ast.parse(line, mode="eval").body
+    except SyntaxError:
+        return None
+    if isinstance(call, ast.Call) and isinstance(call.func, ast.Name):
+        return call
+    return None
+
+
+def _paragraphs(text: str) -> Iterator[List[str]]:
+    """Yield the runs of non-blank lines in *text*, split like str.splitlines()."""
+    paragraph: List[str] = []
+    for line in text.splitlines():
+        if line and not line.isspace():
+            paragraph.append(line)
+        elif paragraph:
+            yield paragraph
+            paragraph = []
+    if paragraph:
+        yield paragraph
+
+
+@_lru_cache_short(maxsize=512)
+def _parse_inline_block(block: str) -> Optional[Tuple[ast.Call, ...]]:
+    """
+    Parse a paragraph that consists solely of ``name(...)`` call statements.
+
+    Returns:
+        The Call nodes in order, or None if the paragraph is not valid
+        Python on its own or holds any other statement (assignments,
+        blocks, strings), which is left to the line-by-line parse
+    """
+    try:
+        tree = ast.parse(block)
+    except (SyntaxError, ValueError):
+        return None
+    calls = []
+    for node in tree.body:
+        if not (type(node) is ast.Expr and isinstance(node.value, ast.Call)
+                and isinstance(node.value.func, ast.Name)):
+            return None
+        calls.append(node.value)
+    return tuple(calls)
+
+
+def _call_owns_lines(call: ast.Call, lines: List[str], prefilter) -> bool:
+    """
+    True if a block-parsed call sits on its lines as a single-line call would.
+
+    The call must open its first line, that line must pass the name
+    prefilter, and nothing but a comment may follow it on its last line, so
+    a paragraph parse never accepts "a(); b()" or a call the line-by-line
+    parse would reject.
+    """
+    if call.col_offset != 0 or prefilter(lines[call.lineno - 1]) is None:
+        return False
+    # AST end offsets count UTF-8 bytes
+    rest = lines[call.end_lineno - 1].encode("utf-8")[call.end_col_offset:].strip()
+    return not rest or rest.startswith(b"#")
 
 
 def _extract_inline_calls(
-    response: str, allowed_tools: Optional[list],
+    response: str, allowed_tools: Optional[Iterable[str]],
 ) -> List[Tuple[str, List[Any], Dict[str, Any]]]:
-    allowed_names = set(allowed_tools or [])
+    # Callers holding a precomputed frozenset skip the per-call copy.
+    if isinstance(allowed_tools, frozenset):
+        allowed_names = allowed_tools
+    else:
+        allowed_names = frozenset(allowed_tools or ())
+    # One anchored regex match per line replaces a startswith per tool name;
+    # with no names to match, lines that cannot hold a call skip ast.parse
+    if allowed_names:
+        prefilter = _inline_call_pattern(allowed_names).match
+    else:
+        prefilter = _CALL_PARENS_RE.match
     calls: List[Tuple[str, list, dict]] = []
-    for line in response.splitlines():
-        line = line.strip()
-        if not line:
+    for paragraph in _paragraphs(response):
+        candidates = [line for line in paragraph if prefilter(line) is not None]
+        if not candidates:
             continue
-        if not allowed_names or any(
-            line.startswith(f"{name}(") for name in allowed_names
+        # A paragraph of bare calls parses whole, which also picks up calls
+        # spanning lines; anything else falls back to line by line
+        nodes = _parse_inline_block("\n".join(paragraph))
+        if nodes is not None and not all(
+            _call_owns_lines(call, paragraph, prefilter) for call in nodes
         ):
+            nodes = None
+        if nodes is None:
+            nodes = [call for call in map(_parse_inline_call, map(str.strip, candidates))
+                     if call is not None]
+        for call in nodes:
+            func_name = call.func.id
+            if allowed_names and func_name not in allowed_names:
+                continue
+            args: list = []
+            kwargs: dict = {}
             try:
-                node = ast.parse(line, mode="eval")
-            except SyntaxError:
+                for arg in call.args:
+                    args.append(_literal_value(arg))
+                for kw in call.keywords:
+                    if kw.arg:
+                        kwargs[kw.arg] = _literal_value(kw.value)
+            except (ValueError, SyntaxError):
                 continue
-            call = node.body
-            if isinstance(call, ast.Call) and isinstance(call.func, ast.Name):
-                func_name = call.func.id
-                if allowed_names and func_name not in allowed_names:
-                    continue
-                args: list = []
-                kwargs: dict = {}
-                try:
-                    for arg in call.args:
-                        args.append(ast.literal_eval(arg))
-                    for kw in call.keywords:
-                        if kw.arg:
-                            kwargs[kw.arg] = ast.literal_eval(kw.value)
-                except (ValueError, SyntaxError):
-                    continue
-                calls.append((func_name, args, kwargs))
+            calls.append((func_name, args, kwargs))
     return calls
@@ -193,6 +193,120 @@ class TestFileReadWrite(unittest.TestCase):
         self.assertEqual(result2["page"], 2)
         self.assertNotEqual(result["content"], result2["content"])
 
+    def test_read_file_pagination_large_file(self):
+        """Later pages of a large file should match a plain line split."""
+        lines = [f"Line {i} " + "x" * 40 for i in range(1, 10001)]
+        self.tools.write_file("huge.txt", "\n".join(lines))
+        
+        for page in (2, 7, 20):
+            result = self.tools.read_file("huge.txt", page=page, page_size=500)
+            expected = "\n".join(lines[(page - 1) * 500:page * 500])
+            if page < 20:
+                expected += "\n"
+            self.assertEqual(result["page"], page)
+            self.assertEqual(result["total_lines"], 10000)
+            self.assertEqual(result["content"], expected)
+
+    def test_read_file_sees_swapped_file(self):
+        """A same-size, same-mtime file swapped in must not hit stale caches."""
+        self.tools.write_file("swap.txt", "a\nb\n")
+        file_path = os.path.join(self.temp_dir, "swap.txt")
+        self.assertEqual(self.tools.read_file("swap.txt")["total_lines"], 2)
+
+        old = os.stat(file_path)
+        tmp_path = os.path.join(self.temp_dir, "swap.new")
+        with open(tmp_path, "w") as f:
+            f.write("abc\n")
+        os.utime(tmp_path, ns=(old.st_atime_ns, old.st_mtime_ns))
+        os.replace(tmp_path, file_path)
+
+        result = self.tools.read_file("swap.txt")
+        self.assertEqual(result["total_lines"], 1)
+        self.assertEqual(result["content"], "abc\n")
+
+    def test_write_file_replaces_atomically(self):
+        """Should keep the file's permissions and leave no temp files behind."""
+        self.tools.write_file("script.sh", "echo old\n")
+        file_path = os.path.join(self.temp_dir, "script.sh")
+        os.chmod(file_path, 0o750)
+        
+        self.tools.write_file("script.sh", "echo new\n")
+        
+        self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o750)
+        self.assertEqual(os.listdir(self.temp_dir), ["script.sh"])
+
+    @unittest.skipIf(hasattr(os, "geteuid") and os.geteuid() == 0,
+                     "root can write read-only files")
+    def test_write_file_read_only_rejected(self):
+        """Should refuse to replace a file the caller cannot write."""
+        self.tools.write_file("locked.txt", "original")
+        file_path = os.path.join(self.temp_dir, "locked.txt")
+        os.chmod(file_path, 0o444)
+
+        with self.assertRaises(ToolError):
+            self.tools.write_file("locked.txt", "overwritten")
+        with self.assertRaises(ToolError):
+            self.tools.write_files([("locked.txt", "overwritten")])
+
+        with open(file_path) as f:
+            self.assertEqual(f.read(), "original")
+
+    @unittest.skipUnless(hasattr(os, "geteuid") and os.geteuid() == 0,
+                         "only root can give a file to another user")
+    def test_write_file_keeps_owner(self):
+        """Should carry another user's ownership over to the rewritten file."""
+        self.tools.write_file("owned.txt", "old")
+        file_path = os.path.join(self.temp_dir, "owned.txt")
+        os.chown(file_path, 65534, 65534)
+
+        self.tools.write_file("owned.txt", "new")
+
+        st = os.stat(file_path)
+        self.assertEqual((st.st_uid, st.st_gid), (65534, 65534))
+
+    def test_write_file_keeps_hard_links(self):
+        """Should rewrite a hard-linked file in place so every link sees it."""
+        self.tools.write_file("a.txt", "old")
+        link_path = os.path.join(self.temp_dir, "b.txt")
+        os.link(os.path.join(self.temp_dir, "a.txt"), link_path)
+
+        self.tools.write_file("a.txt", "new")
+
+        with open(link_path) as f:
+            self.assertEqual(f.read(), "new")
+
+    def test_write_file_bytes(self):
+        """Should write bytes content verbatim."""
+        data = b"\x00\xffbinary\r\n"
+        
+        result = self.tools.write_file("blob.bin", data)
+        
+        self.assertEqual(result["size"], len(data))
+        with open(os.path.join(self.temp_dir, "blob.bin"), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_write_files_batch(self):
+        """Should write every file and report each like write_file."""
+        self.tools.write_file("a.txt", "old")
+        
+        result = self.tools.write_files([
+            ("a.txt", "new"),
+            ("pkg/b.py", "x = 1\n"),
+            ("pkg/c.py", ""),
+        ])
+        
+        self.assertEqual(result["total"], 3)
+        self.assertEqual([r["created"] for r in result["files"]], [False, True, True])
+        self.assertEqual(result["files"][1]["size"], 6)
+        self.assertEqual(self.tools.read_file("a.txt")["content"], "new")
+
+    def test_write_files_rejects_before_writing(self):
+        """Should not write anything when one path escapes the working dir."""
+        with self.assertRaises(PathError):
+            self.tools.write_files([("ok.txt", "x"), ("../escape.txt", "x")])
+        
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "ok.txt")))
+
     def test_write_file_creates_parent_directories(self):
         """Should create parent directories if needed."""
         result = self.tools.write_file("nested/dir/file.txt", "Content")
@@ -233,6 +347,14 @@ class TestFileEditing(unittest.TestCase):
         result = self.tools.read_file("test.txt")
         self.assertEqual(result["content"], "Hello Python\n")
 
+    def test_edit_file_hunk_past_end_rejected(self):
+        """Should raise ToolError when a hunk starts beyond the last line."""
+        self.tools.write_file("test.txt", "one\ntwo\n")
+        diff = "--- test.txt\n+++ test.txt\n@@ -9,1 +9,1 @@\n-nine\n+NINE\n"
+        
+        with self.assertRaises(ToolError):
+            self.tools.edit_file("test.txt", diff)
+
     def test_edit_file_multiple_replacements(self):
         """Should replace multiple occurrences."""
         self.tools.write_file("test.txt", "foo bar foo baz foo\n")
@@ -345,6 +467,33 @@ class TestFileSearch(unittest.TestCase):
         self.assertEqual(result["total_matches"], 3)
         self.assertTrue(any(Path(m).name == "nested.py" for m in result["matches"]))
 
+    def test_search_files_recursive_multiple_subdirs(self):
+        """Should find matches across every subtree, skipping hidden dirs."""
+        self.tools.write_file("dir2/deep/more.py", "# Python")
+        self.tools.write_file("dir3/other.txt", "# Text")
+        self.tools.write_file(".hidden/secret.py", "# Python")
+        
+        result = self.tools.search_files("**/*.py", ".")
+        
+        self.assertEqual(sorted(result["matches"]), [
+            os.path.join("dir1", "nested.py"),
+            os.path.join("dir2", "deep", "more.py"),
+            "file1.py",
+            "file2.py",
+        ])
+
+    def test_search_files_truncates_at_cap(self):
+        """Should return at most the cap, in sorted order."""
+        from main.agent.tool_runner import DEFAULT_MAX_SEARCH_RESULTS
+        for i in range(DEFAULT_MAX_SEARCH_RESULTS + 5):
+            self.tools.write_file(f"many/f{i:03d}.log", "")
+        
+        result = self.tools.search_files("many/*.log", ".")
+        self.assertTrue(result["truncated"])
+        self.assertEqual(result["total_matches"], DEFAULT_MAX_SEARCH_RESULTS)
+        self.assertEqual(result["matches"][0], os.path.join("many", "f000.log"))
+        self.assertEqual(result["matches"][-1], os.path.join("many", "f099.log"))
+
     def test_search_files_single_file(self):
         """Should find single file."""
         result = self.tools.search_files("file3.txt", ".")
@@ -482,6 +631,36 @@ class TestSecurity(unittest.TestCase):
         with self.assertRaises(PathError):
             self.tools.read_file("/etc/passwd")
 
+    def test_sibling_with_shared_prefix_rejected(self):
+        """A sibling directory sharing the working dir's name prefix is outside it."""
+        sibling = self.temp_dir + "_sibling"
+        os.makedirs(sibling)
+        self.addCleanup(os.rmdir, sibling)
+        with self.assertRaises(PathError):
+            self.tools.list_directory(sibling)
+
+    def test_path_swapped_for_outside_symlink_rejected(self):
+        """A validated path later replaced by a symlink out of the tree is rejected."""
+        import shutil
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        with open(os.path.join(outside, "secret.txt"), "w") as f:
+            f.write("secret")
+
+        self.tools.write_file("data/secret.txt", "inside")
+        self.assertEqual(self.tools.read_file("data/secret.txt")["content"], "inside")
+
+        shutil.rmtree(os.path.join(self.temp_dir, "data"))
+        os.symlink(outside, os.path.join(self.temp_dir, "data"))
+        with self.assertRaises(PathError):
+            self.tools.read_file("data/secret.txt")
+        with self.assertRaises(PathError):
+            self.tools.write_file("data/secret.txt", "overwritten")
+        with self.assertRaises(PathError):
+            self.tools.delete_file("data/secret.txt")
+        with open(os.path.join(outside, "secret.txt")) as f:
+            self.assertEqual(f.read(), "secret")
+
     def test_relative_path_validation(self):
         """Should allow legitimate relative paths."""
         self.tools.write_file("test.txt", "Content")
@@ -550,6 +729,7 @@ class TestPackageManagement(unittest.TestCase):
             "/etc/package",
             "\\windows\\system32",
             "package/subdir",
+            "package\n",
         ]
         for name in invalid_names:
             self.assertFalse(
@@ -572,6 +752,29 @@ class TestPackageManagement(unittest.TestCase):
         self.assertEqual(result["language"], "python")
         self.assertFalse(result["installed"])
 
+    def test_check_packages_installed_batch(self):
+        """Should report every requested package without spawning pip."""
+        with mock.patch("subprocess.run", wraps=subprocess.run) as run:
+            result = self.tools.check_packages_installed(
+                ["pip", "totally-fake-package-xyz"], language="python")
+        
+        run.assert_not_called()
+        self.assertEqual(set(result), {"pip", "totally-fake-package-xyz"})
+        self.assertTrue(result["pip"]["installed"])
+        self.assertFalse(result["totally-fake-package-xyz"]["installed"])
+
+    def test_list_installed_packages_reuses_recent_listing(self):
+        """Should serve a second listing from cache until an install happens."""
+        with mock.patch("subprocess.run", wraps=subprocess.run) as run:
+            first = self.tools.list_installed_packages(language="python")
+            second = self.tools.list_installed_packages(language="python")
+            self.assertEqual(run.call_count, 1)
+            self.assertEqual(first, second)
+            
+            self.tools._package_listings.pop("python")
+            self.tools.list_installed_packages(language="python")
+            self.assertEqual(run.call_count, 2)
+
     def test_list_installed_packages_python(self):
         """Should list installed Python packages."""
         result = self.tools.list_installed_packages(language="python")
@@ -586,6 +789,54 @@ class TestPackageManagement(unittest.TestCase):
         with self.assertRaises(PackageError):
             self.tools.search_package("requests", language="ruby")
 
+    def test_search_package_reuses_recent_result(self):
+        """Should answer a repeated search from the cache without refetching."""
+        from main.agent import tool_runner
+        payload = {"info": {"name": "cached-pkg", "version": "1.0"}, "releases": {"1.0": []}}
+        self.addCleanup(tool_runner._package_search_cache.pop, ("python", "cached-pkg"), None)
+        
+        with mock.patch.object(tool_runner, "_fetch_registry_json", return_value=payload) as fetch:
+            first = self.tools.search_package("cached-pkg")
+            second = self.tools.search_package("cached-pkg")
+        
+        fetch.assert_called_once()
+        self.assertTrue(first["found"])
+        self.assertEqual(first, second)
+
+    def test_install_packages_single_pip_run(self):
+        """Should install every package with one pip invocation."""
+        completed = subprocess.CompletedProcess(args=[], returncode=0, stdout="", stderr="")
+        with mock.patch("subprocess.run", return_value=completed) as run:
+            result = self.tools.install_packages([("pip", None), ("httpx", ">=0.1")])
+        
+        run.assert_called_once()
+        cmd = run.call_args[0][0]
+        self.assertEqual(cmd[-2:], ["pip", "httpx>=0.1"])
+        self.assertTrue(result["success"])
+        self.assertEqual([p["package"] for p in result["packages"]], ["pip", "httpx"])
+        self.assertTrue(all(p["installed_version"] for p in result["packages"]))
+
+    def test_install_npm_package_reads_installed_version(self):
+        """Should take the version from node_modules without running npm ls."""
+        pkg_dir = os.path.join(self.temp_dir, "node_modules", "leftpad")
+        os.makedirs(pkg_dir)
+        with open(os.path.join(pkg_dir, "package.json"), "w") as f:
+            json.dump({"name": "leftpad", "version": "1.3.0"}, f)
+        completed = subprocess.CompletedProcess(args=[], returncode=0, stdout="", stderr="")
+        
+        with mock.patch("subprocess.run", return_value=completed) as run:
+            result = self.tools.install_package("leftpad", language="javascript")
+        
+        run.assert_called_once()
+        self.assertEqual(result["installed_version"], "1.3.0")
+
+    def test_install_packages_rejects_any_invalid_name(self):
+        """Should refuse the whole batch if one name is invalid."""
+        with mock.patch("subprocess.run") as run:
+            with self.assertRaises(PackageError):
+                self.tools.install_packages([("requests", None), ("bad;name", None)])
+        run.assert_not_called()
+
     def test_install_invalid_package_name(self):
         """Should reject installation of packages with invalid names."""
         from tools import PackageError
@@ -767,6 +1018,26 @@ class TestGitPushBranch(unittest.TestCase):
         self.assertIn("origin", push_cmd)
         self.assertIn("feature/test", push_cmd)
 
+    def test_push_branch_reads_head_file(self):
+        """Should take the current branch from .git/HEAD without rev-parse."""
+        repo_dir = os.path.join(self.temp_dir, "test_repo")
+        os.makedirs(os.path.join(repo_dir, ".git"), exist_ok=True)
+        with open(os.path.join(repo_dir, ".git", "HEAD"), "w") as f:
+            f.write("ref: refs/heads/feature/from-head\n")
+
+        completed_remote = subprocess.CompletedProcess(args=[], returncode=0, stdout="origin\n", stderr="")
+        completed_push = subprocess.CompletedProcess(args=[], returncode=0, stdout="pushed\n", stderr="")
+
+        with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=[
+            completed_remote,
+            completed_push,
+        ]) as mocked_run:
+            result = self.tools.push_branch("test_repo")
+
+        self.assertEqual(result["branch_name"], "feature/from-head")
+        self.assertEqual(mocked_run.call_count, 2)
+        self.assertIn("feature/from-head", mocked_run.call_args_list[-1][0][0])
+
     def test_push_branch_no_remote(self):
         """Should raise GitError when no remote is configured."""
         repo_dir = os.path.join(self.temp_dir, "test_repo")
@@ -790,6 +1061,10 @@ class TestGitCreatePullRequest(unittest.TestCase):
         """Set up test fixtures."""
         self.temp_dir = tempfile.mkdtemp()
         self.tools = AgentTools(working_dir=self.temp_dir)
+        # The gh lookup is cached on the class; start each test uncached
+        patcher = mock.patch.object(AgentTools, "_gh_available", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
         """Clean up temporary directory."""
@@ -801,7 +1076,6 @@ class TestGitCreatePullRequest(unittest.TestCase):
         repo_dir = os.path.join(self.temp_dir, "test_repo")
         os.makedirs(os.path.join(repo_dir, ".git"), exist_ok=True)
 
-        completed_gh = subprocess.CompletedProcess(args=[], returncode=0, stdout="gh version 2.0\n", stderr="")
         completed_rev = subprocess.CompletedProcess(args=[], returncode=0, stdout="feature_add\n", stderr="")
         completed_pr = subprocess.CompletedProcess(
             args=[],
@@ -810,12 +1084,12 @@ class TestGitCreatePullRequest(unittest.TestCase):
             stderr="",
         )
 
-        with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=[
-            completed_gh,
-            completed_rev,
-            completed_pr,
-        ]) as mocked_run:
-            result = self.tools.create_pull_request("test_repo", base_branch="main")
+        with mock.patch("main.agent.tool_runner.shutil.which", return_value="/usr/bin/gh"):
+            with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=[
+                completed_rev,
+                completed_pr,
+            ]) as mocked_run:
+                result = self.tools.create_pull_request("test_repo", base_branch="main")
 
         self.assertTrue(result["success"])
         self.assertEqual(result["pr_url"], "https://github.com/example/repo/pull/1")
@@ -834,7 +1108,6 @@ class TestGitCreatePullRequest(unittest.TestCase):
         repo_dir = os.path.join(self.temp_dir, "test_repo")
         os.makedirs(os.path.join(repo_dir, ".git"), exist_ok=True)
 
-        completed_gh = subprocess.CompletedProcess(args=[], returncode=0, stdout="gh version 2.0\n", stderr="")
         completed_rev = subprocess.CompletedProcess(args=[], returncode=0, stdout="feature_add\n", stderr="")
         completed_pr = subprocess.CompletedProcess(
             args=[],
@@ -843,12 +1116,12 @@ class TestGitCreatePullRequest(unittest.TestCase):
             stderr="A pull request already exists for branch feature_add",
         )
 
-        with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=[
-            completed_gh,
-            completed_rev,
-            completed_pr,
-        ]):
-            result = self.tools.create_pull_request("test_repo", base_branch="main")
+        with mock.patch("main.agent.tool_runner.shutil.which", return_value="/usr/bin/gh"):
+            with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=[
+                completed_rev,
+                completed_pr,
+            ]):
+                result = self.tools.create_pull_request("test_repo", base_branch="main")
 
         self.assertTrue(result["success"])
         self.assertTrue(result.get("already_exists"))
@@ -858,9 +1131,11 @@ class TestGitCreatePullRequest(unittest.TestCase):
         repo_dir = os.path.join(self.temp_dir, "test_repo")
         os.makedirs(os.path.join(repo_dir, ".git"), exist_ok=True)
 
-        with mock.patch("main.agent.tool_runner.subprocess.run", side_effect=FileNotFoundError()):
-            with self.assertRaises(GitError):
-                self.tools.create_pull_request("test_repo")
+        with mock.patch("main.agent.tool_runner.shutil.which", return_value=None):
+            with mock.patch("main.agent.tool_runner.subprocess.run") as mocked_run:
+                with self.assertRaises(GitError):
+                    self.tools.create_pull_request("test_repo")
+        mocked_run.assert_not_called()
 
 
 if __name__ == "__main__":